@@ -0,0 +1,181 @@
+import os
+import csv
+import json
+import time
+import argparse
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from blink_client import graphql_request, get_cache_dir, api_key_fingerprint, RoundTripCounter, DEFAULT_POOL_SIZE
+from balance import BALANCES_QUERY
+from wallet_cache import store_wallets
+
+load_dotenv()
+
+DEFAULT_KEYRING = "keyring.json"
+DEFAULT_BALANCE_MAX_AGE = 60
+REPORT_FIELDS = ["name", "status", "btc_balance", "usd_balance", "cached", "age", "latency_ms", "error"]
+
+def load_keyring(path):
+    # Either a JSON object of name -> API key, a JSON list of {name, api_key}
+    # objects, or a CSV file with name and api_key columns.
+    if os.name == "posix" and os.stat(path).st_mode & 0o077:
+        print(f"Warning: keyring {path} is readable by other users; restrict it with chmod 600.")
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            data = json.load(f)
+            if isinstance(data, dict):
+                rows = [{"name": name, "api_key": api_key} for name, api_key in data.items()]
+            else:
+                rows = data
+    accounts = []
+    names = set()
+    for line_number, row in enumerate(rows, start=1):
+        name = (row.get("name") or "").strip() or f"account-{line_number}"
+        api_key = (row.get("api_key") or "").strip()
+        if not api_key:
+            raise ValueError(f"Keyring entry {line_number} ({name}) has no api_key")
+        if name in names:
+            raise ValueError(f"Keyring has more than one account named {name}")
+        names.add(name)
+        accounts.append({"name": name, "api_key": api_key})
+    return accounts
+
+def balance_cache_path(api_key):
+    return os.path.join(get_cache_dir(), f"balances-{api_key_fingerprint(api_key)}.json")
+
+def cached_balances(api_key, max_age):
+    try:
+        with open(balance_cache_path(api_key)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - entry.get("fetched_at", 0) > max_age:
+        return None
+    return entry
+
+def store_balances(api_key, balances):
+    entry = {"fetched_at": time.time(), "balances": balances}
+    path = balance_cache_path(api_key)
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print("Could not write balance cache:", e)
+    return entry
+
+def fetch_balances(api_key):
+    # Errors are returned rather than printed, so hundreds of accounts do not
+    # interleave their messages; the report names the account instead.
+    response = graphql_request(api_key, BALANCES_QUERY)
+    if response.status_code != 200:
+        return None, f"HTTP {response.status_code}: {response.text[:200]}"
+    data = response.json()
+    if not data.get("data") or not data["data"].get("me"):
+        errors = data.get("errors") or [{"message": "No account data in response"}]
+        return None, errors[0]["message"]
+    wallets = data["data"]["me"]["defaultAccount"]["wallets"]
+    store_wallets(api_key, wallets)
+    return {wallet["walletCurrency"]: wallet["balance"] for wallet in wallets}, None
+
+def account_balances(account, max_age=DEFAULT_BALANCE_MAX_AGE):
+    start = time.monotonic()
+    row = {"name": account["name"], "status": "OK", "btc_balance": None, "usd_balance": None,
+           "cached": False, "age": None, "latency_ms": None, "error": None}
+    # One account failing, however it fails, must not stop the others.
+    try:
+        entry = cached_balances(account["api_key"], max_age) if max_age > 0 else None
+        if entry is not None:
+            row["cached"] = True
+        else:
+            balances, error = fetch_balances(account["api_key"])
+            if balances is None:
+                row["status"], row["error"] = "FAILED", error
+            else:
+                entry = store_balances(account["api_key"], balances)
+        if entry is not None:
+            row["btc_balance"] = entry["balances"].get("BTC")
+            row["usd_balance"] = entry["balances"].get("USD")
+            row["age"] = round(time.time() - entry["fetched_at"], 1)
+    except Exception as e:
+        row["status"], row["error"] = "FAILED", f"{type(e).__name__}: {e}"
+    row["latency_ms"] = round((time.monotonic() - start) * 1000, 1)
+    return row
+
+def collect_balances(accounts, workers=DEFAULT_POOL_SIZE, max_age=DEFAULT_BALANCE_MAX_AGE):
+    # Every worker shares the pooled session in blink_client, so keeping the
+    # worker count at the pool size reuses connections instead of opening more.
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(accounts)))) as executor:
+        return list(executor.map(lambda account: account_balances(account, max_age), accounts))
+
+def summarize(rows):
+    ok = [row for row in rows if row["status"] == "OK"]
+    return {
+        "accounts": len(rows),
+        "ok": len(ok),
+        "failed": len(rows) - len(ok),
+        "cached": sum(1 for row in ok if row["cached"]),
+        "btc_balance": sum(row["btc_balance"] or 0 for row in ok),
+        "usd_balance": sum(row["usd_balance"] or 0 for row in ok),
+    }
+
+def format_usd(cents):
+    # USD wallet balances are in cents.
+    return "" if cents is None else f"${Decimal(cents) / 100:,.2f}"
+
+def print_report(rows, summary):
+    width = max([len("account")] + [len(row["name"]) for row in rows])
+    print(f"{'account':<{width}} {'BTC (sats)':>14} {'USD':>14} {'source':>8}  error")
+    for row in rows:
+        btc = "" if row["btc_balance"] is None else f"{row['btc_balance']:,}"
+        source = "cache" if row["cached"] else ("api" if row["status"] == "OK" else "-")
+        print(f"{row['name']:<{width}} {btc:>14} {format_usd(row['usd_balance']):>14} {source:>8}  {row['error'] or ''}")
+    print(f"{'total':<{width}} {summary['btc_balance']:>14,} {format_usd(summary['usd_balance']):>14}")
+    print(f"{summary['ok']} of {summary['accounts']} accounts reported ({summary['cached']} from cache), {summary['failed']} failed")
+
+def write_report(path, rows):
+    with open(path, "w", newline="") as f:
+        if path.endswith(".csv"):
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+def add_arguments(parser):
+    parser.add_argument("--keyring", default=os.getenv("BLINK_KEYRING", DEFAULT_KEYRING),
+                        help="JSON or CSV file with a name and api_key for each account")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BLINK_POOL_SIZE", DEFAULT_POOL_SIZE)),
+                        help="Accounts queried concurrently (default: the connection pool size)")
+    parser.add_argument("--max-age", type=float, default=float(os.getenv("BLINK_BALANCE_MAX_AGE", DEFAULT_BALANCE_MAX_AGE)),
+                        help="Reuse balances fetched within this many seconds; 0 always queries the API")
+    parser.add_argument("--output", help="Also write the per-account report to this file (.csv or .jsonl)")
+
+def run(args):
+    try:
+        accounts = load_keyring(args.keyring)
+    except (OSError, ValueError) as e:
+        print("Could not load keyring:", e)
+        return 1
+    if not accounts:
+        print("Keyring has no accounts.")
+        return 1
+    with RoundTripCounter() as round_trips:
+        rows = collect_balances(accounts, args.workers, args.max_age)
+    summary = summarize(rows)
+    print_report(rows, summary)
+    print("Round trips:", round_trips.count)
+    if args.output:
+        write_report(args.output, rows)
+        print("Report written to", args.output)
+    return 0 if not summary["failed"] else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report BTC and USD balances for every account in a keyring.")
+    add_arguments(parser)
+    run(parser.parse_args())
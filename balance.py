@@ -1,45 +1,59 @@
 import os
 from dotenv import load_dotenv
-import requests
+from blink_client import graphql_request
+from wallet_cache import store_wallets
 
 load_dotenv()
 auth_token = os.getenv("API_KEY")
 
-def get_btc_balance(auth_token):
-    url = "https://api.blink.sv/graphql"
-    headers = {
-        "content-type": "application/json",
-        "X-API-KEY": auth_token,
-    }
-
-    query = """
-    query Me {
-      me {
-        defaultAccount {
-          wallets {
-            walletCurrency
-            balance
-          }
-        }
+BALANCES_QUERY = """
+query Balances {
+  me {
+    defaultAccount {
+      wallets {
+        id
+        walletCurrency
+        balance
       }
     }
-    """
-
-    response = requests.post(url, json={"query": query}, headers=headers)
+  }
+}
+"""
 
+def parse_balances_response(response):
     if response.status_code == 200:
         data = response.json()
-        wallets = data["data"]["me"]["defaultAccount"]["wallets"]
-        for wallet in wallets:
-            if wallet["walletCurrency"] == "BTC":
-                return wallet["balance"]
-        print("BTC wallet not found.")
-        return None
+        return data["data"]["me"]["defaultAccount"]["wallets"]
     else:
         print("Failed to fetch balances. Status code:", response.status_code)
         print("Response:", response.text)
         return None
 
-btc_balance = get_btc_balance(auth_token)
-if btc_balance is not None:
-    print(f"Your BTC balance: {btc_balance} satoshis")
+def get_wallet_balances(auth_token):
+    wallets = parse_balances_response(graphql_request(auth_token, BALANCES_QUERY))
+    if wallets is None:
+        return None
+    store_wallets(auth_token, wallets)
+    return {wallet["walletCurrency"]: wallet["balance"] for wallet in wallets}
+
+def get_btc_balance(auth_token):
+    balances = get_wallet_balances(auth_token)
+    if balances is None:
+        return None
+    if "BTC" not in balances:
+        print("BTC wallet not found.")
+        return None
+    return balances["BTC"]
+
+def add_arguments(parser):
+    pass
+
+def run(args):
+    btc_balance = get_btc_balance(auth_token)
+    if btc_balance is not None:
+        print(f"Your BTC balance: {btc_balance} satoshis")
+        return 0
+    return 1
+
+if __name__ == "__main__":
+    run(None)
@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FLOWS = ("balance", "send", "lnurl", "receive", "proof", "price")
+DEFAULT_CONCURRENCY = "1,4,16"
+DEFAULT_REQUESTS = 200
+BENCHMARK_TOKEN = "benchmark-api-key"
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+def configure_environment(url, args):
+    # The scripts read these at import time, so they are set before any of
+    # them is imported.
+    os.environ["BLINK_GRAPHQL_URL"] = url
+    os.environ["BLINK_STAGING_GRAPHQL_URL"] = url
+    os.environ.setdefault("BLINK_CACHE_DIR", tempfile.mkdtemp(prefix="blink-bench-"))
+    os.environ["BLINK_RATE_LIMIT"] = str(args.rate_limit)
+    os.environ["BLINK_NO_DAEMON"] = "1"
+
+def build_flows(auth_token, lnurl_address, price_max_age):
+    from balance import get_btc_balance
+    from wallet_cache import get_wallet_id
+    from send import probe_invoice_fee, pay_invoice_journaled, create_ln_invoice
+    from receive import create_lightning_invoice
+    from proof import lookup_proof
+    from price import convert_satoshi
+    from transaction_index import TransactionIndex, default_index_path
+    from payment_journal import open_payment_journal
+    from bolt11 import check_invoice
+    from mock_blink import make_invoice
+
+    wallet_id = get_wallet_id(auth_token)
+    journal = open_payment_journal(auth_token)
+    index_path = default_index_path(auth_token)
+    index = TransactionIndex(index_path)
+    index.sync(auth_token)
+    # The proof flow looks up a transaction that is really in the history,
+    # so it times an index hit rather than a miss.
+    row = index.conn.execute(
+        "SELECT payment_hash FROM transactions WHERE payment_hash IS NOT NULL ORDER BY created_at LIMIT 1"
+    ).fetchone()
+    proof_hash = row["payment_hash"] if row else None
+    index.close()
+
+    def balance():
+        return get_btc_balance(auth_token) is not None
+
+    def pay(payment_request):
+        check_invoice(payment_request)
+        if probe_invoice_fee(auth_token, wallet_id, payment_request) is None:
+            return False
+        payment = pay_invoice_journaled(journal, auth_token, wallet_id, payment_request)
+        return payment is not None and not payment["errors"]
+
+    def send():
+        return pay(make_invoice(100)["paymentRequest"])
+
+    def lnurl():
+        return pay(create_ln_invoice(100, lnurl_address, "benchmark"))
+
+    def receive():
+        return create_lightning_invoice(auth_token, wallet_id, 100, "benchmark") is not None
+
+    def proof():
+        index = TransactionIndex(index_path)
+        try:
+            index.sync(auth_token)
+            if proof_hash is None:
+                return index.count() == 0
+            return lookup_proof(index, proof_hash) is not None
+        finally:
+            index.close()
+
+    def price():
+        return convert_satoshi(1000, "USD", price_max_age) is not None
+
+    flows = {"balance": balance, "send": send, "lnurl": lnurl, "receive": receive, "proof": proof, "price": price}
+    return flows, journal
+
+def timed(flow):
+    start = time.perf_counter()
+    try:
+        ok = bool(flow())
+    except Exception:
+        ok = False
+    return time.perf_counter() - start, ok
+
+def run_level(flow, concurrency, requests):
+    from blink_client import RoundTripCounter
+    with RoundTripCounter() as round_trips, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        results = list(executor.map(lambda _: timed(flow), range(requests)))
+        elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(1 for _, ok in results if not ok),
+        "throughput": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "round_trips_per_request": round(round_trips.count / requests, 2),
+    }
+
+def print_report(report):
+    print(f"{'flow':<8} {'conc':>5} {'reqs':>6} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'rt/req':>7}")
+    for flow, levels in report.items():
+        for level in levels:
+            print(
+                f"{flow:<8} {level['concurrency']:>5} {level['requests']:>6} {level['errors']:>6} "
+                f"{level['throughput']:>9} {level['p50_ms']:>9} {level['p99_ms']:>9} {level['round_trips_per_request']:>7}"
+            )
+
+def add_arguments(parser):
+    parser.add_argument("--url", help="GraphQL URL of an already running server (default: start a local mock)")
+    parser.add_argument("--flows", default=",".join(FLOWS), help=f"Comma separated flows to run: {', '.join(FLOWS)}")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Requests per flow and concurrency level")
+    parser.add_argument("--latency", type=float, default=0.02, help="Mock server latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Mock server latency jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock responses that are 500s")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of mock responses that are 429s")
+    parser.add_argument("--transactions", type=int, default=1000, help="Transactions seeded into the mock history")
+    parser.add_argument("--price-max-age", type=float, default=0, help="Price cache staleness bound; 0 fetches every time")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Client rate limit per second; 0 disables it")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+
+def run(args):
+    server = None
+    url = args.url
+    if url is None:
+        from mock_blink import MockBlink, start_mock_server
+        mock = MockBlink(args.latency, args.jitter, args.error_rate, args.throttle_rate, 0.05, args.transactions, 100)
+        server = start_mock_server(mock)
+        url = "http://%s:%d/graphql" % server.server_address[:2]
+    configure_environment(url, args)
+    lnurl_address = "bench@" + url.split("//", 1)[1].split("/", 1)[0]
+    flow_names = [name.strip() for name in args.flows.split(",") if name.strip()]
+    unknown = [name for name in flow_names if name not in FLOWS]
+    if unknown:
+        print("Unknown flows:", ", ".join(unknown))
+        return 2
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    print(f"Benchmarking against {url}")
+    report = {}
+    # The scripts print their own progress and errors; keep the report readable.
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            flows, journal = build_flows(os.getenv("API_KEY") or BENCHMARK_TOKEN, lnurl_address, args.price_max_age)
+        try:
+            for name in flow_names:
+                report[name] = []
+                for level in levels:
+                    with contextlib.redirect_stdout(devnull):
+                        result = run_level(flows[name], level, args.requests)
+                    report[name].append(result)
+        finally:
+            if journal is not None:
+                journal.close()
+            if server is not None:
+                server.shutdown()
+    print_report(report)
+    if args.json_path:
+        from blink_metrics import get_metrics
+        with open(args.json_path, "w") as f:
+            json.dump({"flows": report, "operations": get_metrics().snapshot()}, f, indent=2)
+        print("Results written to", args.json_path)
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure throughput and latency of the Blink flows against a mock server.")
+    add_arguments(parser)
+    sys.exit(run(parser.parse_args()))
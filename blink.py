@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import socket
+import hashlib
+import argparse
+import importlib
+
+DAEMON_TIMEOUT = 60
+
+# Command modules are imported only once a command has been chosen, so
+# `blink balance` never loads qrcode and `blink --help` loads no network code.
+COMMANDS = {
+    "balance": ("balance", "Show the BTC wallet balance"),
+    "accounts": ("accounts", "Report BTC and USD balances for every account in a keyring"),
+    "send": ("send", "Pay a Lightning invoice or LNURL, or run a batch payout"),
+    "receive": ("receive", "Create Lightning invoices"),
+    "proof": ("proof", "Look up the settlement of a payment"),
+    "export": ("export", "Export the transaction history to CSV, JSONL or Parquet"),
+    "price": ("price", "Convert satoshis into other currencies"),
+    "contacts": ("contacts", "List, search, add and bulk import contacts"),
+    "daemon": ("blink_daemon", "Run a resident daemon that the other commands forward to"),
+    "mock": ("mock_blink", "Run a local stand-in for the Blink API and an LNURL service"),
+    "benchmark": ("benchmark", "Measure throughput and latency of each flow against the mock API"),
+}
+
+def daemon_socket_path():
+    default_dir = os.path.join(os.path.expanduser("~"), ".blink")
+    return os.getenv("BLINK_DAEMON_SOCKET", os.path.join(os.getenv("BLINK_CACHE_DIR", default_dir), "daemon.sock"))
+
+def key_fingerprint(auth_token):
+    # Same digest as blink_client.api_key_fingerprint, without importing the
+    # network stack just to forward a command.
+    return hashlib.sha256((auth_token or "").encode()).hexdigest()[:16]
+
+def daemon_request(cmd, args=None, socket_path=None, timeout=DAEMON_TIMEOUT, key=None):
+    socket_path = socket_path or daemon_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+    request = {"cmd": cmd, "args": args or {}}
+    if key is not None:
+        request["key"] = key
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(timeout)
+            connection.connect(socket_path)
+            connection.sendall(json.dumps(request, separators=(",", ":")).encode() + b"\n")
+            buffer = b""
+            while not buffer.endswith(b"\n"):
+                chunk = connection.recv(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+    except OSError:
+        return None
+    if not buffer:
+        return None
+    return json.loads(buffer)
+
+def print_daemon_result(command, response):
+    if not response["ok"]:
+        print("Error:", response["error"])
+        return 1
+    result = response["result"]
+    if command == "balance":
+        print(f"Your BTC balance: {result} satoshis")
+    elif command == "price":
+        for conversion in result:
+            if conversion["value"] is None:
+                print(f"No price available for {conversion['currency']}.")
+            elif conversion["currency"] == "BTC":
+                print(f"{conversion['amount']} satoshi is equal to {conversion['value']} BTC.")
+            else:
+                print(f"{conversion['amount']} satoshi is approximately {conversion['symbol']}{conversion['value']} {conversion['currency']}.")
+    elif command == "proof":
+        if result:
+            print(f"Amount (satoshis): {result.get('settlementAmount', 'N/A')}")
+            print(f"Status: {result.get('status', 'N/A')}")
+        else:
+            print("No matching transaction found for the provided payment request.")
+    elif command == "invoice":
+        print("Invoice created successfully:")
+        print("Payment Request:", result["paymentRequest"])
+        print("Payment Hash:", result["paymentHash"])
+        print("Payment Secret:", result["paymentSecret"])
+        print("Satoshis:", result["satoshis"])
+        if result.get("currency"):
+            print(f"Price: {result['symbol']}{result['fiatAmount']} {result['currency']}")
+    return 0
+
+def daemon_call(argv):
+    # Only the non-interactive forms are forwarded; anything else runs locally.
+    command, rest = argv[0], argv[1:]
+    if command == "balance" and not rest:
+        return "balance", {}
+    if command == "price" and len(rest) >= 2 and not any(arg.startswith("-") for arg in rest):
+        try:
+            return "price", {"amount": float(rest[0]), "currencies": rest[1:]}
+        except ValueError:
+            return None
+    if command == "proof" and len(rest) == 1 and not rest[0].startswith("-"):
+        return "proof", {"value": rest[0]}
+    if command == "receive" and rest[:1] == ["--amount"]:
+        parser = argparse.ArgumentParser(add_help=False)
+        parser.add_argument("--amount", required=True)
+        parser.add_argument("--memo")
+        parser.add_argument("--currency")
+        parser.add_argument("--price-max-age", type=float)
+        args, unknown = parser.parse_known_args(rest)
+        if unknown:
+            return None
+        if args.currency:
+            return "invoice", {"amount": args.amount, "memo": args.memo, "currency": args.currency, "max_age": args.price_max_age}
+        try:
+            return "invoice", {"amount": int(args.amount), "memo": args.memo}
+        except ValueError:
+            return None
+    return None
+
+def forward_to_daemon(argv):
+    if os.getenv("BLINK_NO_DAEMON") == "1":
+        return None
+    call = daemon_call(argv)
+    if call is None:
+        return None
+    if not os.path.exists(daemon_socket_path()):
+        return None
+    from dotenv import load_dotenv
+    load_dotenv()
+    cmd, args = call
+    # The daemon only answers for the API key it was started with; any other
+    # key runs the command locally.
+    response = daemon_request(cmd, args, key=key_fingerprint(os.getenv("API_KEY")))
+    if response is None or response.get("key_mismatch"):
+        return None
+    return print_daemon_result(cmd, response)
+
+def print_usage(out=sys.stdout):
+    print("usage: blink <command> [options]\n", file=out)
+    print("commands:", file=out)
+    for name, (_, description) in COMMANDS.items():
+        print(f"  {name:<10} {description}", file=out)
+    print("\nRun 'blink <command> --help' for the options of a command.", file=out)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print_usage()
+        return 0
+    command = argv[0]
+    if command not in COMMANDS:
+        print(f"blink: unknown command '{command}'\n", file=sys.stderr)
+        print_usage(sys.stderr)
+        return 2
+    exit_code = forward_to_daemon(argv)
+    if exit_code is not None:
+        return exit_code
+    module_name, description = COMMANDS[command]
+    module = importlib.import_module(module_name)
+    parser = argparse.ArgumentParser(prog=f"blink {command}", description=description)
+    module.add_arguments(parser)
+    return module.run(parser.parse_args(argv[1:]))
+
+if __name__ == "__main__":
+    sys.exit(main())
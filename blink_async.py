@@ -0,0 +1,120 @@
+import json
+import time
+import asyncio
+import weakref
+import httpx
+from blink_client import GRAPHQL_URL, STAGING_GRAPHQL_URL, build_headers, get_timeout, record_round_trip
+from blink_resilience import get_resilience, is_idempotent
+from blink_metrics import get_metrics, operation_name, error_code, trace_span
+from wallet_cache import WALLETS_QUERY, cached_wallets, store_wallets, parse_wallets_response, find_wallet_id
+from send import (
+    FEE_PROBE_MUTATION,
+    PAYMENT_SEND_MUTATION,
+    payment_variables,
+    parse_fee_probe_response,
+    parse_payment_send_response,
+)
+from receive import INVOICE_CREATE_MUTATION, invoice_create_variables, parse_invoice_create_response
+from contacts import CONTACT_LIST_QUERY, parse_contact_list_response
+from price import REALTIME_PRICE_QUERY, convert_btc, parse_realtime_price_response, apply_price, cached_quote, store_quote
+
+DEFAULT_MAX_CONNECTIONS = 100
+
+_clients = weakref.WeakKeyDictionary()
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        connect_timeout, read_timeout = get_timeout()
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=DEFAULT_MAX_CONNECTIONS, max_keepalive_connections=DEFAULT_MAX_CONNECTIONS),
+        )
+        _clients[loop] = client
+    return client
+
+async def close_async_client():
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+def circuit_open_response(url):
+    return httpx.Response(503, text="Blink API circuit open: too many recent failures, not sending the request")
+
+async def graphql_request(auth_token, query, variables=None, url=GRAPHQL_URL):
+    payload = {"query": query}
+    if variables is not None:
+        payload["variables"] = variables
+    operation = operation_name(payload)
+    body = json.dumps(payload).encode()
+    metrics = get_metrics()
+    attempts = 0
+
+    async def send():
+        nonlocal attempts
+        attempts += 1
+        record_round_trip()
+        start = time.perf_counter()
+        with trace_span(operation, "POST", url, attempts) as span:
+            try:
+                response = await get_async_client().post(url, content=body, headers=build_headers(auth_token))
+            except Exception as e:
+                metrics.observe(operation, time.perf_counter() - start, len(body), 0, type(e).__name__, attempts > 1)
+                raise
+            metrics.observe(operation, time.perf_counter() - start, len(body), len(response.content), error_code(response), attempts > 1)
+            if span is not None:
+                span.set_attribute("http.response.status_code", response.status_code)
+        return response
+
+    def open_response(url):
+        metrics.count_error(operation, "circuit_open")
+        return circuit_open_response(url)
+
+    return await get_resilience().call_async(send, url, is_idempotent(payload), httpx.TransportError, open_response, auth_token)
+
+async def get_wallet_id(auth_token, currency="BTC"):
+    wallets = cached_wallets(auth_token)
+    if wallets is None:
+        wallets = parse_wallets_response(await graphql_request(auth_token, WALLETS_QUERY))
+        if wallets is None:
+            return None
+        wallets = store_wallets(auth_token, wallets)
+    return find_wallet_id(wallets, currency)
+
+async def probe_invoice_fee(auth_token, wallet_id, payment_request):
+    response = await graphql_request(auth_token, FEE_PROBE_MUTATION, payment_variables(wallet_id, payment_request))
+    return parse_fee_probe_response(response)
+
+async def pay_invoice(auth_token, wallet_id, payment_request):
+    response = await graphql_request(auth_token, PAYMENT_SEND_MUTATION, payment_variables(wallet_id, payment_request))
+    return parse_payment_send_response(response)
+
+async def create_lightning_invoice(auth_token, wallet_id, amount_satoshis):
+    response = await graphql_request(auth_token, INVOICE_CREATE_MUTATION, invoice_create_variables(wallet_id, amount_satoshis))
+    return parse_invoice_create_response(response)
+
+async def get_contact_list(api_key):
+    response = await graphql_request(api_key, CONTACT_LIST_QUERY)
+    return parse_contact_list_response(response)
+
+async def convert_satoshi(auth_token, satoshi_amount, currency, max_age=None):
+    currency = currency.upper()
+    if currency == "BTC":
+        return convert_btc(satoshi_amount)
+
+    quote = cached_quote(currency, max_age)
+    if quote is not None:
+        return apply_price(satoshi_amount, currency, quote)
+
+    try:
+        response = await graphql_request(auth_token, REALTIME_PRICE_QUERY, {"currency": currency}, url=STAGING_GRAPHQL_URL)
+    except httpx.HTTPError as e:
+        print("Error during API request:", e)
+        return None
+
+    quote = parse_realtime_price_response(response, currency)
+    if quote is None:
+        return None
+    store_quote(currency, quote)
+    return apply_price(satoshi_amount, currency, quote)
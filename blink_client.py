@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from blink_resilience import get_resilience, is_idempotent
+from blink_metrics import get_metrics, operation_name, error_code, trace_span
+
+# Overridable so every script can be pointed at a local mock server.
+GRAPHQL_URL = os.getenv("BLINK_GRAPHQL_URL", "https://api.blink.sv/graphql")
+STAGING_GRAPHQL_URL = os.getenv("BLINK_STAGING_GRAPHQL_URL", os.getenv("BLINK_GRAPHQL_URL", "https://api.staging.blink.sv/graphql"))
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".blink")
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_POOL_SIZE = 10
+
+_session = None
+_session_lock = threading.Lock()
+_headers_cache = {}
+_round_trips = 0
+_round_trips_lock = threading.Lock()
+
+def get_timeout():
+    connect_timeout = float(os.getenv("BLINK_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT))
+    read_timeout = float(os.getenv("BLINK_READ_TIMEOUT", DEFAULT_READ_TIMEOUT))
+    return (connect_timeout, read_timeout)
+
+def get_cache_dir():
+    cache_dir = os.getenv("BLINK_CACHE_DIR", DEFAULT_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def api_key_fingerprint(auth_token):
+    return hashlib.sha256((auth_token or "").encode()).hexdigest()[:16]
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = int(os.getenv("BLINK_POOL_SIZE", DEFAULT_POOL_SIZE))
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+def build_headers(auth_token):
+    headers = _headers_cache.get(auth_token)
+    if headers is None:
+        headers = {
+            "content-type": "application/json",
+            "X-API-KEY": auth_token,
+        }
+        _headers_cache[auth_token] = headers
+    return headers
+
+def record_round_trip():
+    global _round_trips
+    with _round_trips_lock:
+        _round_trips += 1
+
+def round_trip_count():
+    with _round_trips_lock:
+        return _round_trips
+
+class RoundTripCounter:
+    def __enter__(self):
+        self.start = round_trip_count()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end = round_trip_count()
+
+    @property
+    def count(self):
+        return getattr(self, "end", round_trip_count()) - self.start
+
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+def circuit_open_response(url):
+    # Callers already print non-200 responses, so failing fast looks like any
+    # other unavailable-service reply instead of raising.
+    response = requests.Response()
+    response.status_code = 503
+    response.url = url
+    response._content = b"Blink API circuit open: too many recent failures, not sending the request"
+    return response
+
+def send_request(method, url, session, idempotent, operation, scope=None, **kwargs):
+    metrics = get_metrics()
+    bytes_out = len(kwargs.get("data") or b"")
+    attempts = 0
+
+    def send():
+        nonlocal attempts
+        attempts += 1
+        record_round_trip()
+        start = time.perf_counter()
+        with trace_span(operation, method, url, attempts) as span:
+            try:
+                response = session.request(method, url, **kwargs)
+            except Exception as e:
+                metrics.observe(operation, time.perf_counter() - start, bytes_out, 0, type(e).__name__, attempts > 1)
+                raise
+            code = error_code(response)
+            metrics.observe(operation, time.perf_counter() - start, bytes_out, len(response.content), code, attempts > 1)
+            if span is not None:
+                span.set_attribute("http.response.status_code", response.status_code)
+        return response
+
+    def open_response(url):
+        metrics.count_error(operation, "circuit_open")
+        return circuit_open_response(url)
+
+    return get_resilience().call(send, url, idempotent, TRANSIENT_ERRORS, open_response, scope)
+
+def post_json(auth_token, payload, url=GRAPHQL_URL, timeout=None):
+    if timeout is None:
+        timeout = get_timeout()
+    return send_request(
+        "POST", url, get_session(), is_idempotent(payload), operation_name(payload), scope=auth_token,
+        data=json.dumps(payload).encode(), headers=build_headers(auth_token), timeout=timeout,
+    )
+
+def graphql_request(auth_token, query, variables=None, url=GRAPHQL_URL, timeout=None):
+    payload = {"query": query}
+    if variables is not None:
+        payload["variables"] = variables
+    return post_json(auth_token, payload, url, timeout)
+
+def http_get(url, timeout=None, session=None, operation=None, **kwargs):
+    if timeout is None:
+        timeout = get_timeout()
+    operation = operation or f"GET {urlparse(url).netloc}"
+    return send_request("GET", url, session or get_session(), True, operation, timeout=timeout, **kwargs)
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import socketserver
+from dotenv import load_dotenv
+from blink import daemon_socket_path, daemon_request
+from blink_client import round_trip_count, api_key_fingerprint
+from blink_resilience import get_resilience
+from blink_metrics import get_metrics, start_metrics_server
+from balance import get_btc_balance
+from wallet_cache import get_wallet_id, invalidate_wallets
+from price import get_price_quotes, convert_to_minor_units, minor_to_decimal, whole_satoshis, clear_price_cache, fiat_to_satoshis
+from proof import lookup_proof
+from transaction_index import TransactionIndex, default_index_path
+from receive import create_lightning_invoice, InvoicePool, DEFAULT_POOL_SIZE
+from send import probe_invoice_fee, pay_invoice_journaled
+from payment_journal import open_payment_journal
+from lnurl import get_resolver
+from bolt11 import check_invoice
+from payment_watcher import PaymentWatcher
+
+load_dotenv()
+auth_token = os.getenv("API_KEY")
+
+class BlinkDaemon:
+    def __init__(self, auth_token, pool_amounts=(), pool_size=DEFAULT_POOL_SIZE):
+        self.auth_token = auth_token
+        self.key = api_key_fingerprint(auth_token)
+        self.started_at = time.time()
+        self.requests_served = 0
+        self.index_lock = threading.Lock()
+        self.watcher = PaymentWatcher(auth_token)
+        self.journal = open_payment_journal(auth_token)
+        self.pool = None
+        if pool_amounts:
+            wallet_id = get_wallet_id(auth_token)
+            if wallet_id:
+                self.pool = InvoicePool(auth_token, wallet_id, pool_amounts, pool_size).start()
+        self.handlers = {
+            "ping": self.ping,
+            "stats": self.stats,
+            "balance": self.balance,
+            "price": self.price,
+            "proof": self.proof,
+            "invoice": self.invoice,
+            "lnurl_invoice": self.lnurl_invoice,
+            "probe": self.probe,
+            "pay": self.pay,
+            "watch": self.watch,
+            "wait": self.wait,
+            "invalidate": self.invalidate,
+            "metrics": self.metrics,
+        }
+
+    def close(self):
+        self.watcher.stop()
+        if self.pool:
+            self.pool.stop()
+        if self.journal is not None:
+            self.journal.close()
+
+    def handle(self, request):
+        self.requests_served += 1
+        handler = self.handlers.get(request.get("cmd"))
+        if request.get("cmd") != "ping" and request.get("key") != self.key:
+            return {"ok": False, "error": "The daemon serves a different API key", "key_mismatch": True}
+        if handler is None:
+            return {"ok": False, "error": f"Unknown command: {request.get('cmd')}"}
+        try:
+            return {"ok": True, "result": handler(**(request.get("args") or {}))}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def ping(self):
+        return "pong"
+
+    def stats(self):
+        return {
+            "uptime": round(time.time() - self.started_at, 1),
+            "requests": self.requests_served,
+            "round_trips": round_trip_count(),
+            "circuits": {host: breaker.state for host, breaker in get_resilience().breakers.items()},
+            "watching": len(self.watcher.pending()),
+            "pooled_invoices": {str(amount): len(pool) for amount, pool in self.pool.pools.items()} if self.pool else {},
+        }
+
+    def balance(self):
+        btc_balance = get_btc_balance(self.auth_token)
+        if btc_balance is None:
+            raise Exception("Failed to fetch balance")
+        return btc_balance
+
+    def price(self, amount, currencies, max_age=None):
+        currencies = [currency.upper() for currency in currencies]
+        quotes = get_price_quotes(currencies, max_age)
+        results = []
+        for currency in currencies:
+            conversion = {"amount": f"{amount:.0f}", "currency": currency, "symbol": "", "value": None}
+            if currency == "BTC":
+                conversion["value"] = f"{minor_to_decimal(whole_satoshis(amount), 'BTC'):f}"
+            elif currency in quotes:
+                minor_per_sat, symbol = quotes[currency]
+                minor_amount = convert_to_minor_units([amount], minor_per_sat)[0]
+                conversion.update({"symbol": symbol, "value": f"{minor_to_decimal(minor_amount, currency):f}"})
+            results.append(conversion)
+        return results
+
+    def proof(self, value, sync=True):
+        with self.index_lock:
+            index = TransactionIndex(default_index_path(self.auth_token))
+            try:
+                if sync:
+                    index.sync(self.auth_token)
+                return lookup_proof(index, value)
+            finally:
+                index.close()
+
+    def invoice(self, amount, memo=None, currency=None, max_age=None):
+        if currency:
+            # Quotes are cached in the daemon, so back-to-back checkouts share one price lookup.
+            conversion = fiat_to_satoshis(amount, currency, max_age)
+            if conversion is None:
+                raise Exception(f"No price available for {currency.upper()}")
+            invoice = self.invoice(conversion[0], memo)
+            return dict(invoice, fiatAmount=str(amount), currency=currency.upper(), symbol=conversion[1])
+        if self.pool and not memo and amount in self.pool.pools:
+            return self.pool.take(amount)
+        wallet_id = get_wallet_id(self.auth_token)
+        if not wallet_id:
+            raise Exception("BTC wallet not found")
+        invoice = create_lightning_invoice(self.auth_token, wallet_id, amount, memo)
+        if not invoice:
+            raise Exception("Failed to create invoice")
+        return invoice
+
+    def lnurl_invoice(self, lnurl, amount, memo=""):
+        return get_resolver().request_invoice(amount, lnurl, memo)
+
+    def probe(self, payment_request):
+        check_invoice(payment_request)
+        fee = probe_invoice_fee(self.auth_token, get_wallet_id(self.auth_token), payment_request)
+        if fee is None:
+            raise Exception("Invoice fee could not be retrieved")
+        return fee
+
+    def pay(self, payment_request):
+        result = pay_invoice_journaled(self.journal, self.auth_token, get_wallet_id(self.auth_token), payment_request)
+        if result is None:
+            raise Exception("Payment request failed")
+        return result
+
+    def watch(self, payment_hash, payment_request=None, kind="invoice"):
+        if kind == "invoice":
+            self.watcher.watch_invoice(payment_hash, payment_request)
+        else:
+            self.watcher.watch_payment(payment_hash)
+        return True
+
+    def wait(self, payment_hash, timeout=None):
+        return self.watcher.wait(payment_hash, timeout)
+
+    def metrics(self, format="json"):
+        if format == "prometheus":
+            return get_metrics().prometheus()
+        return get_metrics().snapshot()
+
+    def invalidate(self):
+        invalidate_wallets(self.auth_token)
+        clear_price_cache()
+        get_resolver().invalidate()
+        return True
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                request = None
+            if not isinstance(request, dict):
+                response = {"ok": False, "error": "Invalid request"}
+            elif request.get("cmd") == "shutdown":
+                self.wfile.write(b'{"ok":true,"result":true}\n')
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+            else:
+                response = self.server.blink_daemon.handle(request)
+                if "id" in request:
+                    response["id"] = request["id"]
+            self.wfile.write(json.dumps(response, separators=(",", ":")).encode() + b"\n")
+            self.wfile.flush()
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(auth_token, socket_path, pool_amounts=(), pool_size=DEFAULT_POOL_SIZE, metrics_port=None):
+    if os.path.exists(socket_path):
+        if daemon_request("ping", socket_path=socket_path) is not None:
+            print("A Blink daemon is already running on", socket_path)
+            return 1
+        os.unlink(socket_path)
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    daemon = BlinkDaemon(auth_token, pool_amounts, pool_size)
+    old_umask = os.umask(0o077)
+    try:
+        server = DaemonServer(socket_path, RequestHandler)
+    finally:
+        os.umask(old_umask)
+    server.blink_daemon = daemon
+    metrics_server = None
+    if metrics_port:
+        metrics_server = start_metrics_server(metrics_port)
+        print(f"Prometheus metrics on http://127.0.0.1:{metrics_port}/metrics")
+    print("Blink daemon listening on", socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        daemon.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    return 0
+
+def add_arguments(parser):
+    parser.add_argument("--socket", default=None, help="Unix socket path (default: ~/.blink/daemon.sock)")
+    parser.add_argument("--pool", help="Comma separated invoice amounts to keep pre-created")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="Invoices to keep ready per pooled amount")
+    parser.add_argument("--metrics-port", type=int, default=os.getenv("BLINK_METRICS_PORT"), help="Serve Prometheus metrics on this local port")
+    parser.add_argument("--stop", action="store_true", help="Stop a running daemon")
+
+def run(args):
+    socket_path = args.socket or daemon_socket_path()
+    if args.stop:
+        if daemon_request("shutdown", socket_path=socket_path) is None:
+            print("No Blink daemon is running on", socket_path)
+            return 1
+        print("Blink daemon stopped.")
+        return 0
+    pool_amounts = [int(amount) for amount in args.pool.split(",")] if args.pool else []
+    return serve(auth_token, socket_path, pool_amounts, args.pool_size, args.metrics_port)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a resident Blink daemon on a Unix socket.")
+    add_arguments(parser)
+    sys.exit(run(parser.parse_args()))
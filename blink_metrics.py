@@ -0,0 +1,204 @@
+import os
+import re
+import json
+import atexit
+import threading
+import contextlib
+import importlib.util
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+OPERATION_NAME_RE = re.compile(r"^\s*(?:query|mutation|subscription)\s+(\w+)")
+ROOT_FIELD_RE = re.compile(r"\{\s*(?:\w+\s*:\s*)?(\w+)")
+MERGED_OPERATION_NAME = "mergedOperations"
+
+def operation_name(payload):
+    if isinstance(payload, list):
+        return "batch"
+    query = payload.get("query", "")
+    match = OPERATION_NAME_RE.match(query)
+    if match and match.group(1) != MERGED_OPERATION_NAME:
+        return match.group(1)
+    root = ROOT_FIELD_RE.search(query)
+    field = root.group(1) if root else "anonymous"
+    return f"merged:{field}" if match else field
+
+def error_code(response):
+    if response.status_code != 200:
+        return str(response.status_code)
+    # A cheap scan instead of a second JSON parse; it also catches the
+    # per-payload "errors" lists mutations return with a 200.
+    if b'"errors":[{' in response.content or b'"errors": [{' in response.content:
+        return "graphql"
+    return None
+
+class OperationStats:
+    def __init__(self, buckets):
+        self.buckets = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.retries = 0
+        self.errors = {}
+
+class Metrics:
+    """Per-operation latency histograms and counters for every API call."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bucket_bounds = tuple(buckets)
+        self.operations = {}
+        self.lock = threading.Lock()
+
+    def _stats(self, operation):
+        stats = self.operations.get(operation)
+        if stats is None:
+            stats = self.operations[operation] = OperationStats(self.bucket_bounds)
+        return stats
+
+    def observe(self, operation, seconds, bytes_out=0, bytes_in=0, code=None, retry=False):
+        with self.lock:
+            stats = self._stats(operation)
+            stats.count += 1
+            stats.sum += seconds
+            for i, bound in enumerate(self.bucket_bounds):
+                if seconds <= bound:
+                    stats.buckets[i] += 1
+                    break
+            stats.bytes_out += bytes_out
+            stats.bytes_in += bytes_in
+            if retry:
+                stats.retries += 1
+            if code is not None:
+                stats.errors[code] = stats.errors.get(code, 0) + 1
+
+    def count_error(self, operation, code):
+        with self.lock:
+            stats = self._stats(operation)
+            stats.errors[code] = stats.errors.get(code, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.operations.clear()
+
+    def snapshot(self):
+        with self.lock:
+            snapshot = {}
+            for operation, stats in sorted(self.operations.items()):
+                cumulative, buckets = 0, {}
+                for bound, count in zip(self.bucket_bounds, stats.buckets):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                snapshot[operation] = {
+                    "count": stats.count,
+                    "latency_sum_seconds": round(stats.sum, 6),
+                    "latency_buckets": buckets,
+                    "bytes_out": stats.bytes_out,
+                    "bytes_in": stats.bytes_in,
+                    "retries": stats.retries,
+                    "errors": dict(stats.errors),
+                }
+            return snapshot
+
+    def prometheus(self):
+        lines = [
+            "# HELP blink_request_duration_seconds Latency of Blink API and LNURL requests.",
+            "# TYPE blink_request_duration_seconds histogram",
+        ]
+        snapshot = self.snapshot()
+        for operation, stats in snapshot.items():
+            label = f'operation="{escape_label(operation)}"'
+            for bound, count in stats["latency_buckets"].items():
+                lines.append(f'blink_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'blink_request_duration_seconds_bucket{{{label},le="+Inf"}} {stats["count"]}')
+            lines.append(f"blink_request_duration_seconds_sum{{{label}}} {stats['latency_sum_seconds']}")
+            lines.append(f"blink_request_duration_seconds_count{{{label}}} {stats['count']}")
+        for name, field, description in (
+            ("blink_request_bytes_sent_total", "bytes_out", "Request body bytes sent."),
+            ("blink_request_bytes_received_total", "bytes_in", "Response body bytes received."),
+            ("blink_request_retries_total", "retries", "Requests that were retries of an earlier attempt."),
+        ):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} counter")
+            for operation, stats in snapshot.items():
+                lines.append(f'{name}{{operation="{escape_label(operation)}"}} {stats[field]}')
+        lines.append("# HELP blink_request_errors_total Failed requests by HTTP status, exception or GraphQL error.")
+        lines.append("# TYPE blink_request_errors_total counter")
+        for operation, stats in snapshot.items():
+            for code, count in sorted(stats["errors"].items()):
+                lines.append(f'blink_request_errors_total{{operation="{escape_label(operation)}",code="{escape_label(code)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+_metrics = Metrics()
+
+def get_metrics():
+    return _metrics
+
+_tracer = None
+
+def get_tracer():
+    # OpenTelemetry is optional; spans are only created when it is installed
+    # and BLINK_OTEL=1.
+    global _tracer
+    if _tracer is None:
+        if os.getenv("BLINK_OTEL") == "1" and importlib.util.find_spec("opentelemetry") is not None:
+            from opentelemetry import trace
+            _tracer = trace.get_tracer("blink")
+        else:
+            _tracer = False
+    return _tracer or None
+
+@contextlib.contextmanager
+def trace_span(operation, method, url, attempt):
+    tracer = get_tracer()
+    if tracer is None:
+        yield None
+        return
+    attributes = {"blink.operation": operation, "http.request.method": method, "url.full": url, "blink.attempt": attempt}
+    with tracer.start_as_current_span(f"blink {operation}", attributes=attributes) as span:
+        yield span
+
+def write_metrics(path):
+    if path.endswith((".prom", ".txt")):
+        content = get_metrics().prometheus()
+    else:
+        content = json.dumps(get_metrics().snapshot(), indent=2)
+    with open(path, "w") as f:
+        f.write(content)
+
+def metrics_request_handler():
+    # http.server is only needed when metrics are served, so every other
+    # command skips importing it.
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = get_metrics().prometheus().encode(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(get_metrics().snapshot()).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return MetricsRequestHandler
+
+def start_metrics_server(port, host="127.0.0.1"):
+    from http.server import ThreadingHTTPServer
+    server = ThreadingHTTPServer((host, port), metrics_request_handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="blink-metrics", daemon=True).start()
+    return server
+
+if os.getenv("BLINK_METRICS_DUMP"):
+    atexit.register(write_metrics, os.getenv("BLINK_METRICS_DUMP"))
@@ -0,0 +1,128 @@
+import os
+import re
+import json
+from blink_client import GRAPHQL_URL, graphql_request, post_json
+
+OPERATION_RE = re.compile(r"^\s*(query|mutation)\b\s*\w*\s*(?:\((.*?)\))?\s*\{(.*)\}\s*$", re.S)
+VARIABLE_DEFINITION_RE = re.compile(r"\$(\w+)\s*:\s*([^,$]+)")
+ROOT_FIELD_RE = re.compile(r"^\s*(?:\w+\s*:\s*)?(\w+)")
+
+class Operation:
+    def __init__(self, query, variables=None):
+        match = OPERATION_RE.match(query)
+        if match is None:
+            raise ValueError("Only named or anonymous query/mutation documents can be planned")
+        self.query = query
+        self.variables = variables or {}
+        self.kind = match.group(1)
+        self.variable_definitions = [
+            (name, var_type.strip()) for name, var_type in VARIABLE_DEFINITION_RE.findall(match.group(2) or "")
+        ]
+        self.selection = match.group(3).strip()
+        root_field = ROOT_FIELD_RE.match(self.selection)
+        if root_field is None:
+            raise ValueError("Operation has no root field")
+        self.field = root_field.group(1)
+
+class OperationResponse:
+    # Looks enough like a requests.Response for the per-script parsers.
+    def __init__(self, status_code, payload, text=None):
+        self.status_code = status_code
+        self.payload = payload
+        self.text = text if text is not None else json.dumps(payload)
+
+    def json(self):
+        return self.payload
+
+def batching_enabled():
+    return os.getenv("BLINK_BATCH_REQUESTS", "0") == "1"
+
+def merge_operations(operations):
+    kinds = {operation.kind for operation in operations}
+    if len(kinds) != 1:
+        raise ValueError("Queries and mutations cannot share one document")
+    variable_definitions = []
+    fields = []
+    variables = {}
+    for index, operation in enumerate(operations):
+        alias = f"op{index}"
+        names = {name for name, _ in operation.variable_definitions}
+        for name, var_type in operation.variable_definitions:
+            variable_definitions.append(f"${alias}_{name}: {var_type}")
+            if name in operation.variables:
+                variables[f"{alias}_{name}"] = operation.variables[name]
+        selection = re.sub(
+            r"\$(\w+)\b",
+            lambda match: f"${alias}_{match.group(1)}" if match.group(1) in names else match.group(0),
+            ROOT_FIELD_RE.sub(lambda match: match.group(1), operation.selection, count=1),
+        )
+        fields.append(f"{alias}: {selection}")
+    header = kinds.pop() + " mergedOperations"
+    if variable_definitions:
+        header += "(" + ", ".join(variable_definitions) + ")"
+    query = header + " {\n" + "\n".join(fields) + "\n}\n"
+    return query, variables
+
+def split_merged_response(response, operations):
+    if response.status_code != 200:
+        return [OperationResponse(response.status_code, None, response.text) for _ in operations]
+    payload = response.json()
+    data = payload.get("data") or {}
+    errors = payload.get("errors") or []
+    results = []
+    for index, operation in enumerate(operations):
+        alias = f"op{index}"
+        result = {"data": {operation.field: data.get(alias)}}
+        operation_errors = [error for error in errors if (error.get("path") or [None])[0] == alias]
+        if operation_errors:
+            result["errors"] = operation_errors
+        results.append(OperationResponse(200, result))
+    return results
+
+def execute_merged(auth_token, operations, url=GRAPHQL_URL):
+    if len(operations) == 1:
+        operation = operations[0]
+        return [graphql_request(auth_token, operation.query, operation.variables, url=url)]
+    query, variables = merge_operations(operations)
+    return split_merged_response(graphql_request(auth_token, query, variables, url=url), operations)
+
+def execute_batched(auth_token, operations, url=GRAPHQL_URL):
+    payload = [{"query": operation.query, "variables": operation.variables} for operation in operations]
+    response = post_json(auth_token, payload, url)
+    if 400 <= response.status_code < 500:
+        # The server refused the batch without running any of it.
+        return None
+    results = None
+    if response.status_code == 200:
+        try:
+            results = response.json()
+        except ValueError:
+            pass
+    if isinstance(results, list) and len(results) == len(operations):
+        return [OperationResponse(200, result) for result in results]
+    if any(operation.kind == "mutation" for operation in operations):
+        # The server may already have run the mutations, so they are not
+        # sent again; every operation is reported as failed instead.
+        status_code = response.status_code if response.status_code != 200 else 502
+        return [OperationResponse(status_code, None, response.text) for _ in operations]
+    return None
+
+def execute_operations(auth_token, operations, url=GRAPHQL_URL):
+    # Same-kind operations share one aliased document. Mixed queries and
+    # mutations go out as one JSON array when the server accepts batches,
+    # otherwise as one merged document per kind.
+    if not operations:
+        return []
+    kinds = {operation.kind for operation in operations}
+    if len(kinds) > 1 and batching_enabled():
+        results = execute_batched(auth_token, operations, url)
+        if results is not None:
+            return results
+    results = [None] * len(operations)
+    for kind in ("query", "mutation"):
+        indexes = [index for index, operation in enumerate(operations) if operation.kind == kind]
+        if indexes:
+            responses = execute_merged(auth_token, [operations[index] for index in indexes], url)
+            for index, response in zip(indexes, responses):
+                results[index] = response
+    return results
@@ -0,0 +1,219 @@
+import os
+import re
+import time
+import random
+import threading
+from urllib.parse import urlparse
+
+DEFAULT_RATE_LIMIT = 10.0
+DEFAULT_RATE_BURST = 20
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BASE = 0.5
+DEFAULT_RETRY_MAX = 10.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET = 30.0
+RETRYABLE_STATUS_CODES = frozenset({429, 502, 503, 504})
+MUTATION_RE = re.compile(r"^\s*mutation\b")
+
+class TokenBucket:
+    """Thread-safe token bucket. reserve() takes a token and returns how long
+    the caller must wait for it, so threads and asyncio tasks can share one
+    bucket and each sleep in their own way."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold=DEFAULT_BREAKER_THRESHOLD, reset_timeout=DEFAULT_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        # After reset_timeout one trial call is let through; its outcome
+        # closes the circuit again or keeps it open for another period.
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+def is_idempotent(payload):
+    payloads = payload if isinstance(payload, list) else [payload]
+    return not any(MUTATION_RE.match(item.get("query", "")) for item in payloads)
+
+def retry_after(response):
+    value = response.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+class Resilience:
+    """Per-host rate limiting, retries and circuit breaking shared by the
+    requests and httpx clients. Only idempotent calls are retried; a mutation
+    such as lnInvoicePaymentSend is sent at most once."""
+
+    def __init__(self, rate=DEFAULT_RATE_LIMIT, burst=DEFAULT_RATE_BURST, max_retries=DEFAULT_MAX_RETRIES,
+                 retry_base=DEFAULT_RETRY_BASE, retry_max=DEFAULT_RETRY_MAX,
+                 breaker_threshold=DEFAULT_BREAKER_THRESHOLD, breaker_reset=DEFAULT_BREAKER_RESET):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.limiters = {}
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def limiter(self, url, scope=None):
+        # Blink limits each API key separately, so a keyring of many accounts
+        # gets one bucket per key; the breaker stays per host.
+        if self.rate <= 0:
+            return None
+        key = (urlparse(url).netloc, scope)
+        with self.lock:
+            limiter = self.limiters.get(key)
+            if limiter is None:
+                limiter = self.limiters[key] = TokenBucket(self.rate, self.burst)
+            return limiter
+
+    def breaker(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            breaker = self.breakers.get(host)
+            if breaker is None:
+                breaker = self.breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+            return breaker
+
+    def retry_delay(self, attempt, delay=None):
+        if delay is not None:
+            return min(delay, self.retry_max)
+        return random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt))
+
+    def _record(self, breaker, response):
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def call(self, send, url, idempotent, transient_errors, open_response, scope=None):
+        breaker = self.breaker(url)
+        attempts = self.max_retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            if not breaker.allow():
+                return open_response(url)
+            limiter = self.limiter(url, scope)
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                response = send()
+            except transient_errors:
+                breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+                delay = None
+            except BaseException:
+                # Anything else still ends the trial call of a half-open
+                # breaker, or it would stay half-open for good.
+                breaker.record_failure()
+                raise
+            else:
+                self._record(breaker, response)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt + 1 >= attempts:
+                    return response
+                delay = retry_after(response)
+            time.sleep(self.retry_delay(attempt, delay))
+
+    async def call_async(self, send, url, idempotent, transient_errors, open_response, scope=None):
+        # Imported here so the synchronous commands do not pay for asyncio.
+        import asyncio
+        breaker = self.breaker(url)
+        attempts = self.max_retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            if not breaker.allow():
+                return open_response(url)
+            limiter = self.limiter(url, scope)
+            if limiter is not None:
+                delay = limiter.reserve()
+                if delay:
+                    await asyncio.sleep(delay)
+            try:
+                response = await send()
+            except transient_errors:
+                breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+                delay = None
+            except BaseException:
+                # Anything else still ends the trial call of a half-open
+                # breaker, or it would stay half-open for good.
+                breaker.record_failure()
+                raise
+            else:
+                self._record(breaker, response)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt + 1 >= attempts:
+                    return response
+                delay = retry_after(response)
+            await asyncio.sleep(self.retry_delay(attempt, delay))
+
+_resilience = None
+_resilience_lock = threading.Lock()
+
+def get_resilience():
+    global _resilience
+    if _resilience is None:
+        with _resilience_lock:
+            if _resilience is None:
+                _resilience = Resilience(
+                    rate=float(os.getenv("BLINK_RATE_LIMIT", DEFAULT_RATE_LIMIT)),
+                    burst=float(os.getenv("BLINK_RATE_BURST", DEFAULT_RATE_BURST)),
+                    max_retries=int(os.getenv("BLINK_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+                    retry_base=float(os.getenv("BLINK_RETRY_BASE", DEFAULT_RETRY_BASE)),
+                    retry_max=float(os.getenv("BLINK_RETRY_MAX", DEFAULT_RETRY_MAX)),
+                    breaker_threshold=int(os.getenv("BLINK_BREAKER_THRESHOLD", DEFAULT_BREAKER_THRESHOLD)),
+                    breaker_reset=float(os.getenv("BLINK_BREAKER_RESET", DEFAULT_BREAKER_RESET)),
+                )
+    return _resilience
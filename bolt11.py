@@ -0,0 +1,180 @@
+import os
+import time
+
+CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+CHARSET_MAP = {c: i for i, c in enumerate(CHARSET)}
+GENERATORS = (0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3)
+SIGNATURE_WORDS = 104
+TIMESTAMP_WORDS = 7
+TAG_PAYMENT_HASH = 1
+TAG_PAYMENT_SECRET = 16
+TAG_DESCRIPTION = 13
+TAG_DESCRIPTION_HASH = 23
+TAG_PAYEE = 19
+TAG_EXPIRY = 6
+TAG_MIN_FINAL_CLTV_EXPIRY = 24
+DEFAULT_EXPIRY = 3600
+DEFAULT_MIN_FINAL_CLTV_EXPIRY = 18
+MSAT_PER_BTC = 10 ** 11
+MSAT_PER_UNIT = {"m": 10 ** 8, "u": 10 ** 5, "n": 100, "p": None}
+# Longest prefixes first, so "tbs" (signet) is not read as "tb" (testnet).
+NETWORKS = (("bcrt", "regtest"), ("tbs", "signet"), ("bc", "mainnet"), ("tb", "testnet"), ("sb", "simnet"))
+
+def bech32_polymod(values):
+    checksum = 1
+    for value in values:
+        top = checksum >> 25
+        checksum = (checksum & 0x1FFFFFF) << 5 ^ value
+        for i, generator in enumerate(GENERATORS):
+            if (top >> i) & 1:
+                checksum ^= generator
+    return checksum
+
+def bech32_decode(bech):
+    # Invoices are far longer than the 90 characters BIP-173 allows, so the
+    # length limit is not applied.
+    if bech.lower() != bech and bech.upper() != bech:
+        raise ValueError("Invoice mixes upper and lower case")
+    bech = bech.lower()
+    separator = bech.rfind("1")
+    if separator < 1 or separator + 7 > len(bech):
+        raise ValueError("Invoice is not bech32 encoded")
+    hrp = bech[:separator]
+    try:
+        data = [CHARSET_MAP[c] for c in bech[separator + 1:]]
+    except KeyError:
+        raise ValueError("Invoice contains characters outside the bech32 alphabet")
+    expanded = [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+    if bech32_polymod(expanded + data) != 1:
+        raise ValueError("Invoice checksum is invalid")
+    return hrp, data[:-6]
+
+def bech32_encode(hrp, data):
+    expanded = [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+    polymod = bech32_polymod(expanded + list(data) + [0] * 6) ^ 1
+    checksum = [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + "".join(CHARSET[word] for word in list(data) + checksum)
+
+def int_to_words(value, length):
+    return [(value >> 5 * (length - 1 - i)) & 31 for i in range(length)]
+
+def bytes_to_words(data):
+    value, bits = 0, 0
+    words = []
+    for byte in data:
+        value = value << 8 | byte
+        bits += 8
+        while bits >= 5:
+            bits -= 5
+            words.append(value >> bits & 31)
+    if bits:
+        words.append(value << (5 - bits) & 31)
+    return words
+
+def words_to_int(words):
+    value = 0
+    for word in words:
+        value = value << 5 | word
+    return value
+
+def words_to_bytes(words):
+    value, bits = 0, 0
+    out = bytearray()
+    for word in words:
+        value = value << 5 | word
+        bits += 5
+        if bits >= 8:
+            bits -= 8
+            out.append(value >> bits & 0xFF)
+    return bytes(out)
+
+def iter_tagged_fields(words):
+    i = 0
+    while i + 3 <= len(words):
+        tag = words[i]
+        length = words[i + 1] << 5 | words[i + 2]
+        yield tag, words[i + 3:i + 3 + length]
+        i += 3 + length
+
+def parse_hrp(hrp):
+    if not hrp.startswith("ln"):
+        raise ValueError("Not a Lightning invoice")
+    rest = hrp[2:]
+    for prefix, network in NETWORKS:
+        if rest.startswith(prefix):
+            return network, parse_amount(rest[len(prefix):])
+    raise ValueError(f"Unknown invoice network prefix: {hrp}")
+
+def parse_amount(amount):
+    if not amount:
+        return None
+    multiplier = amount[-1] if amount[-1] in MSAT_PER_UNIT else None
+    digits = amount[:-1] if multiplier else amount
+    if not digits.isdigit() or (len(digits) > 1 and digits[0] == "0"):
+        raise ValueError(f"Invalid invoice amount: {amount}")
+    if multiplier is None:
+        return int(digits) * MSAT_PER_BTC
+    if multiplier == "p":
+        if int(digits) % 10:
+            raise ValueError("Pico-bitcoin amount is not a whole number of millisatoshis")
+        return int(digits) // 10
+    return int(digits) * MSAT_PER_UNIT[multiplier]
+
+def decode(payment_request):
+    # Signature recovery needs secp256k1 and is left to the API; everything
+    # else in the invoice is decoded and checked locally.
+    hrp, data = bech32_decode(payment_request.strip())
+    network, amount_msat = parse_hrp(hrp)
+    if len(data) < TIMESTAMP_WORDS + SIGNATURE_WORDS:
+        raise ValueError("Invoice is too short")
+    invoice = {
+        "network": network,
+        "amount_msat": amount_msat,
+        "amount": amount_msat // 1000 if amount_msat is not None else None,
+        "timestamp": words_to_int(data[:TIMESTAMP_WORDS]),
+        "expiry": DEFAULT_EXPIRY,
+        "payment_hash": None,
+        "payment_secret": None,
+        "description": None,
+        "description_hash": None,
+        "payee": None,
+        "min_final_cltv_expiry": DEFAULT_MIN_FINAL_CLTV_EXPIRY,
+    }
+    for tag, words in iter_tagged_fields(data[TIMESTAMP_WORDS:-SIGNATURE_WORDS]):
+        # Fields of the wrong length must be skipped, per BOLT 11.
+        if tag == TAG_PAYMENT_HASH and len(words) == 52:
+            invoice["payment_hash"] = words_to_bytes(words).hex()
+        elif tag == TAG_PAYMENT_SECRET and len(words) == 52:
+            invoice["payment_secret"] = words_to_bytes(words).hex()
+        elif tag == TAG_DESCRIPTION:
+            invoice["description"] = words_to_bytes(words).decode("utf-8", "replace")
+        elif tag == TAG_DESCRIPTION_HASH and len(words) == 52:
+            invoice["description_hash"] = words_to_bytes(words).hex()
+        elif tag == TAG_PAYEE and len(words) == 53:
+            invoice["payee"] = words_to_bytes(words).hex()
+        elif tag == TAG_EXPIRY:
+            invoice["expiry"] = words_to_int(words)
+        elif tag == TAG_MIN_FINAL_CLTV_EXPIRY:
+            invoice["min_final_cltv_expiry"] = words_to_int(words)
+    if invoice["payment_hash"] is None:
+        raise ValueError("Invoice has no payment hash")
+    invoice["expires_at"] = invoice["timestamp"] + invoice["expiry"]
+    return invoice
+
+def payment_hash(payment_request):
+    return decode(payment_request)["payment_hash"]
+
+def expected_network():
+    return os.getenv("BLINK_NETWORK", "mainnet")
+
+def check_invoice(payment_request, network=None, require_amount=True, min_remaining=0, now=None):
+    invoice = decode(payment_request)
+    network = network or expected_network()
+    if invoice["network"] != network:
+        raise ValueError(f"Invoice is for {invoice['network']}, expected {network}")
+    if require_amount and not invoice["amount_msat"]:
+        raise ValueError("Invoice has no amount")
+    remaining = invoice["expires_at"] - (time.time() if now is None else now)
+    if remaining <= min_remaining:
+        raise ValueError("Invoice has expired" if remaining <= 0 else f"Invoice expires in {remaining:.0f} seconds")
+    return invoice
@@ -1,28 +1,57 @@
 import os
+import csv
+import json
+import time
+import bisect
+import random
+import argparse
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import requests
+from blink_client import graphql_request, get_cache_dir, api_key_fingerprint, RoundTripCounter
+from blink_operations import Operation, execute_operations
 
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
-GRAPHQL_URL = "https://api.blink.sv/graphql"
 
-def get_contact_list(api_key):
-    headers = {
-        "Content-Type": "application/json",
-        "X-API-KEY": api_key
+DEFAULT_STORE_MAX_AGE = 5 * 60
+DEFAULT_IMPORT_WORKERS = 4
+DEFAULT_IMPORT_CHUNK_SIZE = 25
+IMPORT_MAX_ATTEMPTS = 5
+IMPORT_BACKOFF_BASE = 1.0
+IMPORT_BACKOFF_MAX = 30.0
+IMPORT_REPORT_FIELDS = ["line", "username", "alias", "previous_alias", "status", "error", "attempts"]
+DEFAULT_REFRESH_INTERVAL = 5 * 60
+LIGHTNING_ADDRESS_DOMAIN = "blink.sv"
+
+CONTACT_LIST_QUERY = """
+query ContactList {
+  me {
+    contacts {
+      username
+      alias
+      transactionsCount
     }
-    query = """
-    query {
-      me {
-        contacts {
-          username
-          alias
-          transactionsCount
-        }
-      }
+  }
+}
+"""
+
+CONTACT_UPDATE_ALIAS_MUTATION = """
+mutation AddContact($input: UserContactUpdateAliasInput!) {
+  userContactUpdateAlias(input: $input) {
+    contact {
+      username
+      alias
+    }
+    errors {
+      message
     }
-    """
-    response = requests.post(GRAPHQL_URL, json={"query": query}, headers=headers)
+  }
+}
+"""
+
+def parse_contact_list_response(response):
     if response.status_code == 200:
         data = response.json()
         return data.get("data", {}).get("me", {}).get("contacts", [])
@@ -31,72 +60,311 @@ def get_contact_list(api_key):
         print("Response:", response.text)
         return []
 
-def get_contact_details(api_key, username):
-    headers = {
-        "Content-Type": "application/json",
-        "X-API-KEY": api_key
-    }
-    query = """
-    query GetContactDetails($username: Username!) {
-      me {
-        contactByUsername(username: $username) {
-          username
-          alias
-        }
-      }
-    }
-    """
-    variables = {"username": username}
-    response = requests.post(GRAPHQL_URL, json={"query": query, "variables": variables}, headers=headers)
-    if response.status_code == 200:
-        data = response.json()
-        contact = data.get("data", {}).get("me", {}).get("contactByUsername", {})
-        if contact:
-            contact["lightningAddress"] = f"{contact.get('username')}@blink.sv"
-        return contact
-    else:
-        print("Error fetching contact details. Status code:", response.status_code)
-        print("Response:", response.text)
-        return {}
+def get_contact_list(api_key):
+    response = graphql_request(api_key, CONTACT_LIST_QUERY)
+    return parse_contact_list_response(response)
 
-def add_contact(api_key, username, alias):
-    headers = {
-        "Content-Type": "application/json",
-        "X-API-KEY": api_key
-    }
-    mutation = """
-    mutation AddContact($input: UserContactUpdateAliasInput!) {
-      userContactUpdateAlias(input: $input) {
-        contact {
-          username
-          alias
-        }
-        errors {
-          message
-        }
-      }
-    }
-    """
-    variables = {
+def lightning_address(username):
+    return f"{username}@{LIGHTNING_ADDRESS_DOMAIN}"
+
+def contact_alias_variables(username, alias):
+    return {
         "input": {
             "username": username,
             "alias": alias
         }
     }
-    response = requests.post(GRAPHQL_URL, json={"query": mutation, "variables": variables}, headers=headers)
-    if response.status_code == 200:
-        data = response.json()
-        payload = data.get("data", {}).get("userContactUpdateAlias", {})
-        errors = payload.get("errors")
-        if errors:
-            print("Error adding contact:", errors)
-        else:
-            contact = payload.get("contact")
-            print("Contact added/updated successfully:")
-            print(f"Username: {contact.get('username')}, Alias: {contact.get('alias')}")
-    else:
+
+def parse_contact_update_response(response):
+    # Returns (contact, error) so single adds and bulk imports can report alike.
+    if response.status_code != 200:
+        return None, f"Status code {response.status_code}: {response.text}"
+    data = response.json()
+    payload = (data.get("data") or {}).get("userContactUpdateAlias") or {}
+    errors = payload.get("errors") or data.get("errors")
+    if errors:
+        return None, "; ".join(error.get("message", str(error)) for error in errors)
+    contact = payload.get("contact")
+    if not contact:
+        return None, "No contact in response"
+    return contact, None
+
+def add_contact(api_key, username, alias):
+    response = graphql_request(api_key, CONTACT_UPDATE_ALIAS_MUTATION, contact_alias_variables(username, alias))
+    contact, error = parse_contact_update_response(response)
+    if contact:
+        print("Contact added/updated successfully:")
+        print(f"Username: {contact.get('username')}, Alias: {contact.get('alias')}")
+    elif response.status_code != 200:
         print("Error adding contact. Status code:", response.status_code)
         print("Response:", response.text)
+    else:
+        print("Error adding contact:", error)
+    return contact
+
+def contact_store_path(api_key):
+    return os.path.join(get_cache_dir(), f"contacts-{api_key_fingerprint(api_key)}.json")
+
+def contact_sort_key(contact):
+    return (-(contact.get("transactionsCount") or 0), contact["username"].lower())
+
+class ContactStore:
+    """Local copy of the contact list, indexed by username, alias prefix and
+    transaction count. The API only returns the whole list, so a sync downloads
+    it once and applies the difference to the stored copy."""
+
+    def __init__(self, api_key, path=None, max_age=DEFAULT_STORE_MAX_AGE):
+        self.api_key = api_key
+        self.path = path
+        self.max_age = max_age
+        self.lock = threading.RLock()
+        self.contacts = {}
+        self.synced_at = 0
+        self.refresh_thread = None
+        self.stop_event = threading.Event()
+        self._load()
+        self._reindex()
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.contacts = {contact["username"].lower(): contact for contact in entry.get("contacts", [])}
+        self.synced_at = entry.get("synced_at", 0)
+
+    def _save(self):
+        if not self.path:
+            return
+        with self.lock:
+            entry = {"synced_at": self.synced_at, "contacts": list(self.contacts.values())}
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print("Could not write contact store:", e)
+
+    def _reindex(self):
+        with self.lock:
+            contacts = list(self.contacts.values())
+            # Sorted (lowercase username or alias, username key) pairs for bisect prefix search.
+            prefix_index = [(key, key) for key in self.contacts]
+            prefix_index += [(contact["alias"].lower(), key) for key, contact in self.contacts.items() if contact.get("alias")]
+            self.prefix_index = sorted(prefix_index)
+            self.by_username = sorted(contacts, key=lambda contact: contact["username"].lower())
+            self.by_transactions = sorted(contacts, key=contact_sort_key)
+
+    def is_stale(self):
+        return time.time() - self.synced_at > self.max_age
+
+    def sync(self):
+        response = graphql_request(self.api_key, CONTACT_LIST_QUERY)
+        if response.status_code != 200:
+            # Keep the stored copy rather than treating a failed fetch as "no contacts".
+            parse_contact_list_response(response)
+            return None
+        fetched = {}
+        for contact in parse_contact_list_response(response):
+            fetched[contact["username"].lower()] = {
+                "username": contact["username"],
+                "alias": contact.get("alias"),
+                "transactionsCount": contact.get("transactionsCount") or 0,
+            }
+        with self.lock:
+            added = fetched.keys() - self.contacts.keys()
+            removed = self.contacts.keys() - fetched.keys()
+            updated = {key for key in fetched.keys() & self.contacts.keys() if fetched[key] != self.contacts[key]}
+            for key in removed:
+                del self.contacts[key]
+            for key in added | updated:
+                self.contacts[key] = fetched[key]
+            self.synced_at = time.time()
+            if added or removed or updated:
+                self._reindex()
+        self._save()
+        return {"added": len(added), "updated": len(updated), "removed": len(removed)}
+
+    def ensure_fresh(self):
+        if self.is_stale():
+            self.sync()
+        return self
+
+    def upsert(self, contact):
+        self.upsert_many([contact])
+
+    def upsert_many(self, contacts):
+        if not contacts:
+            return
+        with self.lock:
+            for contact in contacts:
+                key = contact["username"].lower()
+                current = self.contacts.get(key, {})
+                self.contacts[key] = {
+                    "username": contact["username"],
+                    "alias": contact.get("alias"),
+                    "transactionsCount": contact.get("transactionsCount", current.get("transactionsCount", 0)),
+                }
+            self._reindex()
+        self._save()
+
+    def list(self, order="username"):
+        with self.lock:
+            return list(self.by_transactions if order == "transactions" else self.by_username)
+
+    def get(self, username):
+        with self.lock:
+            contact = self.contacts.get(username.lower())
+        if contact is None:
+            return {}
+        return dict(contact, lightningAddress=lightning_address(contact["username"]))
+
+    def search(self, prefix, limit=None):
+        prefix = prefix.lower()
+        with self.lock:
+            start = bisect.bisect_left(self.prefix_index, (prefix,))
+            keys = {}
+            for name, key in self.prefix_index[start:]:
+                if not name.startswith(prefix):
+                    break
+                keys[key] = None
+            matches = sorted((self.contacts[key] for key in keys), key=contact_sort_key)
+        return matches[:limit] if limit else matches
+
+    def start_background_refresh(self, interval=DEFAULT_REFRESH_INTERVAL):
+        if self.refresh_thread is not None:
+            return self
+        self.stop_event.clear()
+
+        def refresh():
+            while not self.stop_event.wait(interval):
+                try:
+                    self.sync()
+                except Exception as e:
+                    print("Background contact refresh failed:", e)
+
+        self.refresh_thread = threading.Thread(target=refresh, name="contact-refresh", daemon=True)
+        self.refresh_thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.refresh_thread is not None:
+            self.refresh_thread.join()
+            self.refresh_thread = None
+
+def open_contact_store(api_key):
+    path = None
+    if os.getenv("BLINK_CONTACT_STORE_DISK", "1") != "0":
+        path = contact_store_path(api_key)
+    max_age = float(os.getenv("BLINK_CONTACT_STORE_MAX_AGE", DEFAULT_STORE_MAX_AGE))
+    return ContactStore(api_key, path, max_age)
+
+def iter_import_rows(path):
+    with open(path, newline="") as f:
+        for line_number, row in enumerate(csv.DictReader(f), start=1):
+            yield {
+                "line": line_number,
+                "username": (row.get("username") or "").strip(),
+                "alias": (row.get("alias") or "").strip(),
+            }
+
+def plan_import_row(store, row, seen):
+    result = dict(row, previous_alias=None, status="PENDING", error=None, attempts=0)
+    key = result["username"].lower()
+    if not result["username"] or not result["alias"]:
+        result.update(status="INVALID", error="Username and alias are required")
+    elif key in seen:
+        result.update(status="DUPLICATE", error=f"Username already imported on line {seen[key]}")
+    else:
+        seen[key] = result["line"]
+        current = store.get(result["username"])
+        if current:
+            result["previous_alias"] = current.get("alias")
+            if current.get("alias") == result["alias"]:
+                result["status"] = "UNCHANGED"
+    return result
+
+def import_backoff(attempt):
+    return random.uniform(0, min(IMPORT_BACKOFF_MAX, IMPORT_BACKOFF_BASE * 2 ** attempt))
+
+def import_chunk(api_key, rows):
+    # A 429 means the document was rejected before it ran, and setting an
+    # alias is idempotent, so throttled rows are sent again after a backoff.
+    pending = rows
+    for attempt in range(IMPORT_MAX_ATTEMPTS):
+        operations = [
+            Operation(CONTACT_UPDATE_ALIAS_MUTATION, contact_alias_variables(row["username"], row["alias"]))
+            for row in pending
+        ]
+        throttled = []
+        for row, response in zip(pending, execute_operations(api_key, operations)):
+            row["attempts"] += 1
+            if response.status_code == 429:
+                throttled.append(row)
+                continue
+            contact, error = parse_contact_update_response(response)
+            if contact:
+                row.update(status="UPDATED", contact=contact)
+            else:
+                row.update(status="FAILED", error=error)
+        if not throttled:
+            return rows
+        pending = throttled
+        time.sleep(import_backoff(attempt))
+    for row in pending:
+        row.update(status="FAILED", error="Rate limited")
+    return rows
+
+def write_import_report(f, rows, csv_writer=None):
+    for row in rows:
+        report = {field: row.get(field) for field in IMPORT_REPORT_FIELDS}
+        if csv_writer is not None:
+            csv_writer.writerow(report)
+        else:
+            f.write(json.dumps(report) + "\n")
+
+def run_import(api_key, input_path, output_path, workers=DEFAULT_IMPORT_WORKERS, chunk_size=DEFAULT_IMPORT_CHUNK_SIZE):
+    with RoundTripCounter() as round_trips:
+        summary = _run_import(api_key, input_path, output_path, workers, chunk_size)
+    print("Round trips:", round_trips.count)
+    return summary
+
+def _run_import(api_key, input_path, output_path, workers, chunk_size):
+    store = open_contact_store(api_key)
+    if store.sync() is None:
+        print("Could not fetch the current contact list, import aborted.")
+        return None
+    rows = iter_import_rows(input_path)
+    seen = {}
+    summary = {}
+    # Rows are read, sent and reported one window at a time, so memory stays
+    # flat however long the file is.
+    window_size = workers * chunk_size
+    with open(output_path, "w", newline="") as f, ThreadPoolExecutor(max_workers=workers) as executor:
+        csv_writer = None
+        if output_path.endswith(".csv"):
+            csv_writer = csv.DictWriter(f, fieldnames=IMPORT_REPORT_FIELDS)
+            csv_writer.writeheader()
+        while True:
+            window = [plan_import_row(store, row, seen) for row in itertools.islice(rows, window_size)]
+            if not window:
+                break
+            pending = [row for row in window if row["status"] == "PENDING"]
+            chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+            list(executor.map(lambda chunk: import_chunk(api_key, chunk), chunks))
+            store.upsert_many([row["contact"] for row in window if row["status"] == "UPDATED"])
+            write_import_report(f, window, csv_writer)
+            f.flush()
+            for row in window:
+                summary[row["status"]] = summary.get(row["status"], 0) + 1
+    print("Import finished:", ", ".join(f"{status}: {count}" for status, count in sorted(summary.items())))
+    print("Report written to", output_path)
+    return summary
 
 def print_contact_list(contacts):
     if not contacts:
@@ -108,46 +376,80 @@ def print_contact_list(contacts):
         alias = contact.get("alias") or "None"
         print(f"{idx}. Username: {username} - Alias: {alias}")
 
+def print_contact_details(details):
+    print("\nContact Details:")
+    print("Username:", details.get("username"))
+    print("Alias:", details.get("alias") or "None")
+    print("Lightning Address:", details.get("lightningAddress"))
+
 def main():
-    while True:
-        print("\nMenu:")
-        print("1. List Contacts")
-        print("2. View Contact Details")
-        print("3. Add Contact")
-        print("4. Exit")
-        choice = input("Enter your choice: ")
-        if choice == "1":
-            contacts = get_contact_list(API_KEY)
-            print_contact_list(contacts)
-        elif choice == "2":
-            contacts = get_contact_list(API_KEY)
-            if contacts:
-                print_contact_list(contacts)
-                try:
-                    selection = int(input("Enter the number of the contact to view details: "))
-                    if 1 <= selection <= len(contacts):
-                        selected_username = contacts[selection - 1]["username"]
-                        details = get_contact_details(API_KEY, selected_username)
-                        if details:
-                            print("\nContact Details:")
-                            print("Username:", details.get("username"))
-                            print("Alias:", details.get("alias") or "None")
-                            print("Lightning Address:", details.get("lightningAddress"))
+    # List, search and details are answered from the local store; the network
+    # is only used to sync it and to add contacts.
+    store = open_contact_store(API_KEY).ensure_fresh().start_background_refresh()
+    try:
+        while True:
+            print("\nMenu:")
+            print("1. List Contacts")
+            print("2. View Contact Details")
+            print("3. Add Contact")
+            print("4. Search Contacts")
+            print("5. Refresh Contacts")
+            print("6. Exit")
+            choice = input("Enter your choice: ")
+            if choice == "1":
+                print_contact_list(store.list())
+            elif choice == "2":
+                contacts = store.list()
+                if contacts:
+                    print_contact_list(contacts)
+                    try:
+                        selection = int(input("Enter the number of the contact to view details: "))
+                        if 1 <= selection <= len(contacts):
+                            details = store.get(contacts[selection - 1]["username"])
+                            if details:
+                                print_contact_details(details)
+                            else:
+                                print("No details found for the selected contact.")
                         else:
-                            print("No details found for the selected contact.")
-                    else:
-                        print("Invalid selection.")
-                except ValueError:
-                    print("Please enter a valid number.")
-        elif choice == "3":
-            username = input("Enter the username of the contact to add: ")
-            alias = input("Enter alias for the contact: ")
-            add_contact(API_KEY, username, alias)
-        elif choice == "4":
-            print("Exiting...")
-            break
-        else:
-            print("Invalid choice. Please enter a number between 1 and 4.")
+                            print("Invalid selection.")
+                    except ValueError:
+                        print("Please enter a valid number.")
+                else:
+                    print("No contacts found.")
+            elif choice == "3":
+                username = input("Enter the username of the contact to add: ")
+                alias = input("Enter alias for the contact: ")
+                contact = add_contact(API_KEY, username, alias)
+                if contact:
+                    store.upsert(contact)
+            elif choice == "4":
+                prefix = input("Enter the start of a username or alias: ").strip()
+                print_contact_list(store.search(prefix))
+            elif choice == "5":
+                changes = store.sync()
+                if changes is not None:
+                    print(f"Contacts synced: {changes['added']} added, {changes['updated']} updated, {changes['removed']} removed.")
+            elif choice == "6":
+                print("Exiting...")
+                break
+            else:
+                print("Invalid choice. Please enter a number between 1 and 6.")
+    finally:
+        store.stop()
 
-if __name__ == "__main__":
+def add_arguments(parser):
+    parser.add_argument("--import", dest="import_path", help="CSV file with username and alias columns to import")
+    parser.add_argument("--output", default="contact_import.jsonl", help="Per-row import report (.csv or .jsonl)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_IMPORT_WORKERS, help="Number of concurrent import requests")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_IMPORT_CHUNK_SIZE, help="Alias updates per request")
+
+def run(args):
+    if args.import_path:
+        return 0 if run_import(API_KEY, args.import_path, args.output, args.workers, args.chunk_size) is not None else 1
     main()
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage your Blink contacts.")
+    add_arguments(parser)
+    run(parser.parse_args())
@@ -0,0 +1,337 @@
+import os
+import io
+import csv
+import json
+import glob
+import time
+import argparse
+import importlib.util
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from transactions import iter_transaction_pages
+
+load_dotenv()
+auth_token = os.getenv("API_KEY")
+
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+DEFAULT_EXPORT_PAGE_SIZE = 100
+DEFAULT_PART_ROWS = 100000
+PARQUET_ROW_GROUP_ROWS = 10000
+EXPORT_FIELDS = [
+    "id", "created_at", "direction", "status", "settlement_amount", "settlement_fee", "settlement_currency",
+    "display_amount", "display_currency", "memo", "payment_hash", "pre_image", "counterparty", "address",
+    "transaction_hash",
+]
+
+EXPORT_TRANSACTIONS_QUERY = """
+query TransactionExport($first: Int, $after: String) {
+  me {
+    defaultAccount {
+      transactions(first: $first, after: $after) {
+        pageInfo {
+          hasNextPage
+          endCursor
+        }
+        edges {
+          cursor
+          node {
+            id
+            createdAt
+            direction
+            status
+            memo
+            settlementAmount
+            settlementFee
+            settlementCurrency
+            settlementDisplayAmount
+            settlementDisplayCurrency
+            initiationVia {
+              ... on InitiationViaLn {
+                paymentHash
+              }
+              ... on InitiationViaIntraLedger {
+                counterPartyUsername
+              }
+              ... on InitiationViaOnChain {
+                address
+              }
+            }
+            settlementVia {
+              ... on SettlementViaLn {
+                preImage
+              }
+              ... on SettlementViaIntraLedger {
+                counterPartyUsername
+              }
+              ... on SettlementViaOnChain {
+                transactionHash
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+def flatten_transaction(node):
+    initiation = node.get("initiationVia") or {}
+    settlement = node.get("settlementVia") or {}
+    return {
+        "id": node["id"],
+        "created_at": datetime.fromtimestamp(node["createdAt"], timezone.utc).isoformat(),
+        "direction": node.get("direction"),
+        "status": node.get("status"),
+        "settlement_amount": node.get("settlementAmount"),
+        "settlement_fee": node.get("settlementFee"),
+        "settlement_currency": node.get("settlementCurrency"),
+        "display_amount": node.get("settlementDisplayAmount"),
+        "display_currency": node.get("settlementDisplayCurrency"),
+        "memo": node.get("memo"),
+        "payment_hash": initiation.get("paymentHash"),
+        "pre_image": settlement.get("preImage"),
+        "counterparty": initiation.get("counterPartyUsername") or settlement.get("counterPartyUsername"),
+        "address": initiation.get("address"),
+        "transaction_hash": settlement.get("transactionHash"),
+    }
+
+def parse_time(value, end_of_day=False):
+    # A bare date covers that whole day in UTC; datetimes without an offset
+    # are read as UTC.
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    if end_of_day and len(value) == 10:
+        moment += timedelta(days=1)
+    return moment.timestamp()
+
+def export_format(path, fmt=None):
+    if fmt:
+        return fmt
+    extension = os.path.splitext(path.rstrip("/"))[1].lstrip(".").lower()
+    return extension if extension in EXPORT_FORMATS else "jsonl"
+
+class LineSink:
+    """CSV or JSONL output appended page by page. The byte offset after each
+    synced page is what the checkpoint records, so a resumed export first
+    cuts off anything written after it."""
+
+    def __init__(self, path, fmt, offset=None):
+        self.format = fmt
+        if offset is None:
+            self.file = open(path, "wb")
+            if fmt == "csv":
+                self.file.write(self._encode([], header=True))
+        else:
+            self.file = open(path, "r+b")
+            if os.fstat(self.file.fileno()).st_size < offset:
+                self.file.close()
+                raise ValueError(f"{path} is shorter than its checkpoint; rerun without --resume")
+            self.file.truncate(offset)
+            self.file.seek(offset)
+
+    def _encode(self, rows, header=False):
+        if self.format == "jsonl":
+            return "".join(json.dumps(row) + "\n" for row in rows).encode()
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        if header:
+            writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue().encode()
+
+    def write(self, rows):
+        if rows:
+            self.file.write(self._encode(rows))
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {"offset": self.file.tell()}
+
+    def close(self):
+        state = self.sync()
+        self.file.close()
+        return state
+
+class ParquetSink:
+    """Parquet output as a directory of part files. A part is unreadable
+    until its footer is written, so parts are written under a temporary name
+    and a checkpoint is only taken once a part has been closed."""
+
+    def __init__(self, directory, part=None, part_rows=DEFAULT_PART_ROWS):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.pq = pq
+        self.schema = pa.schema([
+            ("id", pa.string()), ("created_at", pa.timestamp("s", tz="UTC")), ("direction", pa.string()),
+            ("status", pa.string()), ("settlement_amount", pa.int64()), ("settlement_fee", pa.int64()),
+            ("settlement_currency", pa.string()), ("display_amount", pa.string()), ("display_currency", pa.string()),
+            ("memo", pa.string()), ("payment_hash", pa.string()), ("pre_image", pa.string()),
+            ("counterparty", pa.string()), ("address", pa.string()), ("transaction_hash", pa.string()),
+        ])
+        os.makedirs(directory, exist_ok=True)
+        if part is None:
+            for stale in glob.glob(os.path.join(directory, "part-*.parquet")):
+                os.remove(stale)
+        self.directory = directory
+        self.part = part or 0
+        self.part_rows = part_rows
+        self.part_count = 0
+        self.buffer = []
+        self.writer = None
+
+    def part_path(self):
+        return os.path.join(self.directory, f"part-{self.part:05d}.parquet")
+
+    def _write_group(self):
+        if not self.buffer:
+            return
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.part_path() + ".tmp", self.schema)
+        rows = [dict(row, created_at=datetime.fromisoformat(row["created_at"])) for row in self.buffer]
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+        self.part_count += len(self.buffer)
+        self.buffer = []
+
+    def _close_part(self):
+        self._write_group()
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.part_path() + ".tmp", self.part_path())
+            self.writer = None
+            self.part += 1
+            self.part_count = 0
+
+    def write(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= PARQUET_ROW_GROUP_ROWS:
+            self._write_group()
+
+    def sync(self):
+        if self.part_count + len(self.buffer) < self.part_rows:
+            return None
+        self._close_part()
+        return {"part": self.part}
+
+    def close(self):
+        self._close_part()
+        return {"part": self.part}
+
+def open_sink(path, fmt, state=None, part_rows=DEFAULT_PART_ROWS):
+    if fmt == "parquet":
+        return ParquetSink(path, state["part"] if state else None, part_rows)
+    return LineSink(path, fmt, state["offset"] if state else None)
+
+def checkpoint_path(output):
+    return output.rstrip("/") + ".checkpoint.json"
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(dict(checkpoint, updated_at=time.time()), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def export_transactions(auth_token, output, fmt, since=None, until=None, statuses=None,
+                        page_size=DEFAULT_EXPORT_PAGE_SIZE, resume=False, part_rows=DEFAULT_PART_ROWS):
+    path = checkpoint_path(output)
+    filters = {"since": since, "until": until, "status": sorted(statuses) if statuses else None}
+    checkpoint = load_checkpoint(path) if resume else None
+    if checkpoint is not None:
+        if checkpoint["format"] != fmt or checkpoint["filters"] != filters:
+            raise ValueError("The checkpoint was written with a different format or filters; rerun without --resume")
+        if checkpoint["complete"]:
+            print(f"Export already complete: {checkpoint['rows']} transactions in {output}")
+            return checkpoint
+        print(f"Resuming after {checkpoint['rows']} transactions")
+    else:
+        if resume:
+            print("No checkpoint found, starting from the newest transaction")
+        checkpoint = {"format": fmt, "filters": filters, "cursor": None, "rows": 0, "state": None, "complete": False}
+
+    sink = open_sink(output, fmt, checkpoint["state"], part_rows)
+    cursor, rows = checkpoint["cursor"], checkpoint["rows"]
+    complete = False
+    try:
+        # Transactions come newest first, so the page that crosses --since
+        # is the last one that needs fetching.
+        for edges, page_info in iter_transaction_pages(auth_token, page_size, cursor, EXPORT_TRANSACTIONS_QUERY):
+            batch = []
+            for edge in edges:
+                node = edge["node"]
+                if since is not None and node["createdAt"] < since:
+                    complete = True
+                    break
+                if until is not None and node["createdAt"] >= until:
+                    continue
+                if statuses and node.get("status") not in statuses:
+                    continue
+                batch.append(flatten_transaction(node))
+            sink.write(batch)
+            rows += len(batch)
+            if edges:
+                cursor = edges[-1]["cursor"]
+            if complete:
+                break
+            state = sink.sync()
+            if state is not None:
+                checkpoint.update(cursor=cursor, rows=rows, state=state)
+                save_checkpoint(path, checkpoint)
+            print(f"Exported {rows} transactions", end="\r", flush=True)
+        else:
+            complete = True
+    finally:
+        # Everything up to the last fully processed page is on disk once the
+        # sink closes, including after an error or Ctrl-C.
+        checkpoint.update(cursor=cursor, rows=rows, state=sink.close(), complete=complete)
+        save_checkpoint(path, checkpoint)
+    print(f"Exported {rows} transactions to {output}")
+    return checkpoint
+
+def add_arguments(parser):
+    parser.add_argument("--output", default="transactions.csv", help="Output file, or directory for parquet")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="Output format (default: from the --output extension)")
+    parser.add_argument("--since", help="Only transactions at or after this date or ISO datetime (UTC)")
+    parser.add_argument("--until", help="Only transactions before this ISO datetime, or up to the end of this date (UTC)")
+    parser.add_argument("--status", help="Comma separated statuses to keep, e.g. SUCCESS,PENDING")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_EXPORT_PAGE_SIZE, help="Transactions fetched per request")
+    parser.add_argument("--part-rows", type=int, default=DEFAULT_PART_ROWS, help="Rows per parquet part file")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted export from its checkpoint")
+
+def run(args):
+    fmt = export_format(args.output, args.format)
+    if fmt == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        print("Parquet export needs pyarrow: pip install pyarrow")
+        return 1
+    try:
+        since = parse_time(args.since) if args.since else None
+        until = parse_time(args.until, end_of_day=True) if args.until else None
+    except ValueError as e:
+        print("Invalid date:", e)
+        return 1
+    statuses = {status.strip().upper() for status in args.status.split(",") if status.strip()} if args.status else None
+    try:
+        checkpoint = export_transactions(auth_token, args.output, fmt, since, until, statuses,
+                                         args.page_size, args.resume, args.part_rows)
+    except Exception as e:
+        print()
+        print("Export stopped:", e)
+        print("Run again with --resume to continue from the last checkpoint.")
+        return 1
+    return 0 if checkpoint["complete"] else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the transaction history to CSV, JSONL or Parquet.")
+    add_arguments(parser)
+    run(parser.parse_args())
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlunparse, urlencode, parse_qsl
+import requests
+from requests.adapters import HTTPAdapter
+from blink_client import http_get, get_cache_dir
+from bolt11 import check_invoice
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_NEGATIVE_TTL = 5 * 60
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_DOMAIN_POOLS = 100
+LOCAL_HOSTS = ("localhost", "127.0.0.1")
+METADATA_FIELDS = ("callback", "minSendable", "maxSendable", "commentAllowed", "tag")
+
+def lnurlp_url(lnurl):
+    if "@" in lnurl:
+        user, domain = lnurl.split("@", 1)
+        # LUD-16 allows plain http for local test services.
+        scheme = "http" if domain.split(":")[0] in LOCAL_HOSTS else "https"
+        return f"{scheme}://{domain}/.well-known/lnurlp/{user}"
+    return lnurl
+
+class LnurlResolver:
+    def __init__(self, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL, max_workers=DEFAULT_MAX_WORKERS, cache_path=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_workers = max_workers
+        self.cache_path = cache_path
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.inflight = {}
+        # One keep-alive pool per LNURL domain, shared by the lookup and the callback.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=DEFAULT_DOMAIN_POOLS, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._load()
+
+    def _load(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        self.cache = {key: entry for key, entry in entries.items() if entry.get("expires_at", 0) > now}
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        # Saves are serialized, and each goes through its own temporary file,
+        # so concurrent resolves can never replace the cache with a torn file.
+        with self.save_lock:
+            with self.lock:
+                entries = {key: entry for key, entry in self.cache.items() if "metadata" in entry}
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.cache_path) or ".", suffix=".tmp")
+                with os.fdopen(fd, "w") as f:
+                    json.dump(entries, f)
+                os.replace(tmp_path, self.cache_path)
+            except OSError as e:
+                print("Could not write LNURL cache:", e)
+                if tmp_path is not None and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def invalidate(self, lnurl=None):
+        with self.lock:
+            if lnurl is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(lnurl.lower(), None)
+        self._save()
+
+    def _cached(self, key):
+        with self.lock:
+            entry = self.cache.get(key)
+        if entry is None or entry["expires_at"] <= time.time():
+            return None
+        return entry
+
+    def _fetch(self, lnurl):
+        response = http_get(lnurlp_url(lnurl), session=self.session, operation="lnurlp")
+        if response.status_code != 200:
+            raise Exception(f"Could not fetch LNURL-pay info: {response.status_code}")
+        lnurl_data = response.json()
+        if lnurl_data.get("status", "").lower() == "error":
+            raise Exception(f"LNURL-pay error: {lnurl_data.get('reason', 'Unknown error')}")
+        if not lnurl_data.get("callback"):
+            raise Exception("LNURL-pay info does not contain a callback URL")
+        return {field: lnurl_data[field] for field in METADATA_FIELDS if field in lnurl_data}
+
+    def resolve(self, lnurl, save=True):
+        key = lnurl.lower()
+        entry = self._cached(key)
+        if entry is None:
+            with self.lock:
+                event = self.inflight.get(key)
+                owner = event is None
+                if owner:
+                    event = self.inflight[key] = threading.Event()
+            if owner:
+                try:
+                    entry = {"metadata": self._fetch(lnurl), "expires_at": time.time() + self.ttl}
+                except Exception as e:
+                    entry = {"error": str(e), "expires_at": time.time() + self.negative_ttl}
+                with self.lock:
+                    self.cache[key] = entry
+                    del self.inflight[key]
+                event.set()
+                if save and "metadata" in entry:
+                    self._save()
+            else:
+                event.wait()
+                entry = self._cached(key) or {"error": "LNURL-pay lookup failed"}
+        if "error" in entry:
+            raise Exception(entry["error"])
+        return entry["metadata"]
+
+    def resolve_many(self, lnurls):
+        unique = list(dict.fromkeys(lnurls))
+
+        def resolve_one(lnurl):
+            try:
+                return self.resolve(lnurl, save=False)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = dict(zip(unique, executor.map(resolve_one, unique)))
+        # One write for the whole batch instead of one per address.
+        if any(not isinstance(result, Exception) for result in results.values()):
+            self._save()
+        return results
+
+    def request_invoice(self, amount_satoshis, lnurl, memo):
+        msat = amount_satoshis * 1000
+        lnurl_data = self.resolve(lnurl)
+        min_sendable = lnurl_data.get("minSendable", 0)
+        max_sendable = lnurl_data.get("maxSendable", 0)
+        if msat < min_sendable or msat > max_sendable:
+            raise Exception(f"Amount out of range. Minimum {min_sendable // 1000} and maximum {max_sendable // 1000} satoshis allowed.")
+        parsed_url = urlparse(lnurl_data["callback"])
+        query_params = dict(parse_qsl(parsed_url.query))
+        query_params["amount"] = str(msat)
+        comment_allowed = lnurl_data.get("commentAllowed", 0)
+        if comment_allowed > 0 and memo:
+            query_params["comment"] = memo[:comment_allowed]
+        new_callback_url = urlunparse((
+            parsed_url.scheme,
+            parsed_url.netloc,
+            parsed_url.path,
+            parsed_url.params,
+            urlencode(query_params),
+            parsed_url.fragment
+        ))
+        invoice_response = http_get(new_callback_url, session=self.session, operation="lnurlp_callback")
+        if invoice_response.status_code != 200:
+            raise Exception(f"Failed to fetch invoice: {invoice_response.status_code}")
+        invoice_data = invoice_response.json()
+        if invoice_data.get("status", "").lower() == "error":
+            # The callback may have moved, look it up again next time.
+            self.invalidate(lnurl)
+            raise Exception(f"Invoice error: {invoice_data.get('reason', 'Unknown error')}")
+        invoice = invoice_data.get("pr")
+        if not invoice:
+            raise Exception("No invoice found in response")
+        try:
+            decoded = check_invoice(invoice)
+        except ValueError as e:
+            raise Exception(f"Invalid invoice from LNURL service: {e}")
+        # LUD-06: the wallet must check the invoice is for the amount it asked for.
+        if decoded["amount_msat"] != msat:
+            raise Exception(f"LNURL service returned an invoice for {decoded['amount_msat']} msat instead of {msat}")
+        return invoice
+
+_default_resolver = None
+_default_resolver_lock = threading.Lock()
+
+def get_resolver():
+    global _default_resolver
+    if _default_resolver is None:
+        with _default_resolver_lock:
+            if _default_resolver is None:
+                cache_path = None
+                if os.getenv("BLINK_LNURL_CACHE_DISK", "1") != "0":
+                    cache_path = os.path.join(get_cache_dir(), "lnurl.json")
+                _default_resolver = LnurlResolver(
+                    ttl=float(os.getenv("BLINK_LNURL_CACHE_TTL", DEFAULT_TTL)),
+                    negative_ttl=float(os.getenv("BLINK_LNURL_NEGATIVE_TTL", DEFAULT_NEGATIVE_TTL)),
+                    cache_path=cache_path,
+                )
+    return _default_resolver
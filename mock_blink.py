@@ -0,0 +1,385 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bolt11 import (
+    bech32_encode, int_to_words, bytes_to_words, decode,
+    SIGNATURE_WORDS, TAG_PAYMENT_HASH, TAG_PAYMENT_SECRET, TAG_DESCRIPTION, TAG_EXPIRY,
+)
+
+DEFAULT_PORT = 8080
+MSAT_PER_NANO_BTC = 100
+DEFAULT_INVOICE_EXPIRY = 24 * 60 * 60
+# Minor units per satoshi at a made-up ~65k USD/BTC.
+PRICES = {
+    "USD": ("0.065", "$"),
+    "EUR": ("0.06", "€"),
+    "GBP": ("0.051", "£"),
+    "JPY": ("0.1", "¥"),
+    "TRY": ("2.2", "₺"),
+}
+PRICE_OFFSET = 12
+FIELD_RE = re.compile(r"\s*(?:(\w+)\s*:\s*)?(\w+)\s*")
+ARGUMENT_RE = re.compile(r"(\w+)\s*:\s*\$(\w+)")
+
+def tagged_field(tag, words):
+    return [tag, len(words) >> 5, len(words) & 31] + words
+
+def make_invoice(amount_satoshis=None, memo=None, expiry=DEFAULT_INVOICE_EXPIRY, timestamp=None):
+    """Builds a well-formed mainnet BOLT11 invoice. The signature is zeros,
+    which is enough for anything that does not verify it."""
+    preimage = os.urandom(32)
+    payment_hash = hashlib.sha256(preimage).digest()
+    payment_secret = os.urandom(32)
+    hrp = "lnbc" + (f"{amount_satoshis * 1000 // MSAT_PER_NANO_BTC}n" if amount_satoshis else "")
+    data = int_to_words(int(timestamp if timestamp is not None else time.time()), 7)
+    data += tagged_field(TAG_PAYMENT_HASH, bytes_to_words(payment_hash))
+    data += tagged_field(TAG_PAYMENT_SECRET, bytes_to_words(payment_secret))
+    if memo:
+        data += tagged_field(TAG_DESCRIPTION, bytes_to_words(memo.encode()))
+    data += tagged_field(TAG_EXPIRY, int_to_words(expiry, max(1, -(-expiry.bit_length() // 5))))
+    data += [0] * SIGNATURE_WORDS
+    return {
+        "paymentRequest": bech32_encode(hrp, data),
+        "paymentHash": payment_hash.hex(),
+        "paymentSecret": payment_secret.hex(),
+        "preimage": preimage.hex(),
+        "satoshis": amount_satoshis,
+        "memo": memo,
+    }
+
+def top_level_fields(query):
+    # Just enough GraphQL to find each root field, its alias and the
+    # variables used anywhere inside it. Aliased, merged documents included.
+    body = query[query.index("{") + 1:query.rindex("}")]
+    fields = []
+    i = 0
+    while i < len(body):
+        match = FIELD_RE.match(body, i)
+        if match is None or match.end() == i:
+            break
+        alias, name = match.group(1), match.group(2)
+        i = match.end()
+        start = i
+        if i < len(body) and body[i] == "(":
+            i = body.index(")", i) + 1
+        while i < len(body) and body[i].isspace():
+            i += 1
+        if i < len(body) and body[i] == "{":
+            depth = 0
+            for j in range(i, len(body)):
+                if body[j] == "{":
+                    depth += 1
+                elif body[j] == "}":
+                    depth -= 1
+                    if depth == 0:
+                        break
+            i = j + 1
+        fields.append((alias or name, name, body[start:i]))
+    return fields
+
+class MockBlink:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=1.0,
+                 transactions=0, contacts=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.wallets = [
+            {"id": "mock-btc-wallet", "walletCurrency": "BTC", "balance": 10 ** 9},
+            {"id": "mock-usd-wallet", "walletCurrency": "USD", "balance": 10 ** 7},
+        ]
+        self.transactions = []
+        self.by_hash = {}
+        self.invoices = {}
+        self.contacts = {}
+        for i in range(transactions):
+            created_at = time.time() - (transactions - i) * 60
+            invoice = make_invoice(1 + i % 1000, timestamp=created_at)
+            self._add_transaction(invoice, "RECEIVE", invoice["satoshis"], created_at)
+        for i in range(contacts):
+            self.contacts[f"user{i}"] = {"username": f"user{i}", "alias": f"Contact {i}", "transactionsCount": i % 50}
+        self.resolvers = {
+            "me": self.me,
+            "lnInvoiceCreate": self.ln_invoice_create,
+            "lnInvoiceFeeProbe": self.ln_invoice_fee_probe,
+            "lnInvoicePaymentSend": self.ln_invoice_payment_send,
+            "lnInvoicePaymentStatus": self.ln_invoice_payment_status,
+            "realtimePrice": self.realtime_price,
+            "userContactUpdateAlias": self.user_contact_update_alias,
+        }
+
+    def _add_transaction(self, invoice, direction, amount, created_at=None):
+        node = {
+            "id": f"tx{len(self.transactions) + 1}",
+            "createdAt": int(created_at if created_at is not None else time.time()),
+            "direction": direction,
+            "memo": invoice.get("memo"),
+            "initiationVia": {"paymentRequest": invoice["paymentRequest"], "paymentHash": invoice["paymentHash"]},
+            "settlementVia": {"preImage": invoice.get("preimage")},
+            "settlementAmount": amount if direction == "RECEIVE" else -amount,
+            "settlementFee": 0,
+            "settlementCurrency": "BTC",
+            "status": "SUCCESS",
+        }
+        self.transactions.append(node)
+        self.by_hash.setdefault(invoice["paymentHash"], []).append(node)
+        return node
+
+    def fault(self):
+        """Returns (status, headers) for an injected failure, or None."""
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        with self.lock:
+            self.requests += 1
+            draw = self.random.random()
+        if draw < self.throttle_rate:
+            return 429, {"Retry-After": str(self.retry_after)}
+        if draw < self.throttle_rate + self.error_rate:
+            return 500, {}
+        return None
+
+    def execute(self, request):
+        query = request.get("query") or ""
+        variables = request.get("variables") or {}
+        data = {}
+        errors = []
+        for alias, name, text in top_level_fields(query):
+            arguments = {argument: variables.get(variable) for argument, variable in ARGUMENT_RE.findall(text)}
+            resolver = self.resolvers.get(name)
+            if resolver is None:
+                data[alias] = None
+                errors.append({"message": f"Mock server does not implement {name}", "path": [alias]})
+                continue
+            with self.lock:
+                data[alias] = resolver(arguments, text)
+        result = {"data": data}
+        if errors:
+            result["errors"] = errors
+        return result
+
+    def transaction_page(self, first, after):
+        end = int(after) - 1 if after else len(self.transactions)
+        start = max(0, end - first)
+        nodes = self.transactions[start:end][::-1]
+        edges = [{"cursor": node["id"][2:], "node": node} for node in nodes]
+        return {
+            "pageInfo": {"hasNextPage": start > 0, "endCursor": edges[-1]["cursor"] if edges else None},
+            "edges": edges,
+        }
+
+    def me(self, arguments, text):
+        account = {"wallets": [dict(wallet) for wallet in self.wallets]}
+        if "transactions(" in text:
+            account["transactions"] = self.transaction_page(arguments.get("first") or 20, arguments.get("after"))
+        if "walletById" in text:
+            transactions = self.by_hash.get(arguments.get("paymentHash"), [])
+            account["walletById"] = {"transactionsByPaymentHash": [
+                {"status": node["status"], "direction": node["direction"]} for node in transactions
+            ]}
+        me = {"defaultAccount": account}
+        if "contacts" in text:
+            me["contacts"] = [dict(contact) for contact in self.contacts.values()]
+        if "contactByUsername" in text:
+            me["contactByUsername"] = self.contacts.get(arguments.get("username"))
+        return me
+
+    def ln_invoice_create(self, arguments, text):
+        request = arguments.get("input") or {}
+        amount = request.get("amount")
+        if not isinstance(amount, int) or amount <= 0:
+            return {"invoice": None, "errors": [{"message": "Invalid amount"}]}
+        expiry = int(request.get("expiresIn") or DEFAULT_INVOICE_EXPIRY // 60) * 60
+        invoice = make_invoice(amount, request.get("memo"), expiry)
+        self.invoices[invoice["paymentHash"]] = dict(invoice, status="PENDING")
+        return {"invoice": {field: invoice[field] for field in ("paymentRequest", "paymentHash", "paymentSecret", "satoshis")}, "errors": []}
+
+    def _decode(self, arguments):
+        try:
+            return decode((arguments.get("input") or {}).get("paymentRequest") or "")
+        except ValueError:
+            return None
+
+    def ln_invoice_fee_probe(self, arguments, text):
+        invoice = self._decode(arguments)
+        if invoice is None or not invoice["amount"]:
+            return {"amount": None, "errors": [{"message": "Invalid payment request"}]}
+        fee = 0 if invoice["payment_hash"] in self.invoices else max(1, invoice["amount"] // 1000)
+        return {"amount": fee, "errors": []}
+
+    def ln_invoice_payment_send(self, arguments, text):
+        invoice = self._decode(arguments)
+        if invoice is None or not invoice["amount"]:
+            return {"status": "FAILURE", "errors": [{"message": "Invalid payment request"}]}
+        payment_hash = invoice["payment_hash"]
+        if any(node["direction"] == "SEND" for node in self.by_hash.get(payment_hash, [])):
+            return {"status": "ALREADY_PAID", "errors": []}
+        wallet = self.wallets[0]
+        if wallet["balance"] < invoice["amount"]:
+            return {"status": "FAILURE", "errors": [{"message": "Insufficient balance"}]}
+        wallet["balance"] -= invoice["amount"]
+        own = self.invoices.get(payment_hash)
+        if own is not None:
+            own["status"] = "PAID"
+        self._add_transaction(
+            {"paymentRequest": arguments["input"]["paymentRequest"], "paymentHash": payment_hash, "preimage": own and own["preimage"]},
+            "SEND", invoice["amount"],
+        )
+        return {"status": "SUCCESS", "errors": []}
+
+    def ln_invoice_payment_status(self, arguments, text):
+        invoice = self._decode(arguments)
+        own = self.invoices.get(invoice["payment_hash"]) if invoice else None
+        return {"status": own["status"] if own else "PENDING"}
+
+    def realtime_price(self, arguments, text):
+        currency = (arguments.get("currency") or "USD").upper()
+        price, symbol = PRICES.get(currency, ("0.065", currency))
+        whole, _, fraction = price.partition(".")
+        base = int(whole + fraction.ljust(PRICE_OFFSET, "0"))
+        return {"btcSatPrice": {"base": base, "offset": PRICE_OFFSET}, "denominatorCurrencyDetails": {"symbol": symbol}}
+
+    def user_contact_update_alias(self, arguments, text):
+        request = arguments.get("input") or {}
+        username = request.get("username")
+        if not username:
+            return {"contact": None, "errors": [{"message": "Username is required"}]}
+        contact = self.contacts.setdefault(username, {"username": username, "alias": None, "transactionsCount": 0})
+        contact["alias"] = request.get("alias")
+        return {"contact": {"username": username, "alias": contact["alias"]}, "errors": []}
+
+    def lnurlp(self, user, host):
+        return {
+            "tag": "payRequest",
+            "callback": f"http://{host}/lnurlp/{user}/callback",
+            "minSendable": 1000,
+            "maxSendable": 10 ** 11,
+            "metadata": json.dumps([["text/plain", f"Pay {user}"]]),
+            "commentAllowed": 140,
+        }
+
+    def lnurlp_callback(self, user, query):
+        try:
+            msat = int(query.get("amount", ["0"])[0])
+        except ValueError:
+            msat = 0
+        if msat <= 0 or msat % 1000:
+            return {"status": "ERROR", "reason": "Amount must be a whole number of satoshis"}
+        invoice = make_invoice(msat // 1000, query.get("comment", [None])[0])
+        with self.lock:
+            self.invoices[invoice["paymentHash"]] = dict(invoice, status="PENDING")
+        return {"pr": invoice["paymentRequest"], "routes": []}
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, keep-alive
+    # clients would wait on delayed ACKs and every request would read ~40 ms.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fault(self):
+        fault = self.server.mock.fault()
+        if fault is None:
+            return False
+        status, headers = fault
+        message = "Too many requests" if status == 429 else "Internal server error"
+        self._send(status, {"errors": [{"message": message}]}, headers)
+        return True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if urlparse(self.path).path != "/graphql":
+            self._send(404, {"errors": [{"message": "Not found"}]})
+            return
+        if self._fault():
+            return
+        try:
+            request = json.loads(body)
+        except ValueError:
+            self._send(400, {"errors": [{"message": "Invalid JSON"}]})
+            return
+        if isinstance(request, list):
+            self._send(200, [self.server.mock.execute(item) for item in request])
+        else:
+            self._send(200, self.server.mock.execute(request))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if parts[:2] == [".well-known", "lnurlp"] and len(parts) == 3:
+            if not self._fault():
+                self._send(200, self.server.mock.lnurlp(parts[2], self.headers.get("Host")))
+        elif parts[0] == "lnurlp" and len(parts) == 3 and parts[2] == "callback":
+            if not self._fault():
+                self._send(200, self.server.mock.lnurlp_callback(parts[1], parse_qs(url.query)))
+        else:
+            self._send(404, {"status": "ERROR", "reason": "Not found"})
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+def start_mock_server(mock, host="127.0.0.1", port=0):
+    server = MockServer((host, port), MockRequestHandler)
+    server.mock = mock
+    thread = threading.Thread(target=server.serve_forever, name="mock-blink", daemon=True)
+    thread.start()
+    return server
+
+def add_arguments(parser):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency of up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--transactions", type=int, default=1000, help="Transactions in the seeded history")
+    parser.add_argument("--contacts", type=int, default=100, help="Contacts in the seeded contact list")
+    parser.add_argument("--seed", type=int, default=None)
+
+def mock_from_args(args):
+    return MockBlink(args.latency, args.jitter, args.error_rate, args.throttle_rate, args.retry_after,
+                     args.transactions, args.contacts, args.seed)
+
+def run(args):
+    server = MockServer((args.host, args.port), MockRequestHandler)
+    server.mock = mock_from_args(args)
+    host, port = server.server_address[:2]
+    print(f"Mock Blink API on http://{host}:{port}/graphql")
+    print(f"Point the scripts at it with BLINK_GRAPHQL_URL=http://{host}:{port}/graphql")
+    print(f"Lightning addresses resolve as <name>@{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Blink GraphQL API and an LNURL-pay service.")
+    add_arguments(parser)
+    run(parser.parse_args())
@@ -0,0 +1,228 @@
+import os
+import time
+import sqlite3
+import threading
+from blink_client import get_cache_dir, api_key_fingerprint
+from blink_operations import Operation, execute_operations
+from wallet_cache import get_wallet_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS payments (
+    payment_hash TEXT PRIMARY KEY,
+    payment_request TEXT NOT NULL,
+    amount INTEGER,
+    status TEXT NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS payments_status ON payments (status);
+CREATE TABLE IF NOT EXISTS batch_items (
+    key TEXT PRIMARY KEY,
+    destination TEXT NOT NULL,
+    amount INTEGER,
+    payment_hash TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payment_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    detail TEXT,
+    at REAL NOT NULL
+);
+"""
+
+# SENDING is written and committed before the mutation goes out; PENDING is
+# Blink's own answer for a payment still routing. Both may have moved money.
+IN_FLIGHT_STATUSES = ("SENDING", "PENDING")
+# Only a payment known to have failed may be sent again.
+RETRYABLE_STATUSES = ("FAILED",)
+TRANSACTION_STATUSES = {"SUCCESS": "SUCCESS", "FAILURE": "FAILED", "PENDING": "PENDING"}
+DEFAULT_RECONCILE_GRACE = 60
+RECONCILE_CHUNK_SIZE = 25
+
+PAYMENT_STATUS_QUERY = """
+query PaymentStatus($walletId: WalletId!, $paymentHash: PaymentHash!) {
+  me {
+    defaultAccount {
+      walletById(walletId: $walletId) {
+        transactionsByPaymentHash(paymentHash: $paymentHash) {
+          status
+          direction
+        }
+      }
+    }
+  }
+}
+"""
+
+class DuplicatePaymentError(Exception):
+    def __init__(self, entry):
+        super().__init__(f"Payment {entry['payment_hash']} is already journaled with status {entry['status']}")
+        self.entry = entry
+
+def fetch_send_statuses(auth_token, wallet_id, payment_hashes):
+    """Blink's status of the outgoing transaction for each payment hash, or
+    None when the wallet has none. Hashes whose lookup failed are left out."""
+    statuses = {}
+    for i in range(0, len(payment_hashes), RECONCILE_CHUNK_SIZE):
+        chunk = payment_hashes[i:i + RECONCILE_CHUNK_SIZE]
+        operations = [Operation(PAYMENT_STATUS_QUERY, {"walletId": wallet_id, "paymentHash": payment_hash}) for payment_hash in chunk]
+        for payment_hash, response in zip(chunk, execute_operations(auth_token, operations)):
+            if response.status_code != 200:
+                continue
+            data = response.json()
+            try:
+                transactions = data["data"]["me"]["defaultAccount"]["walletById"]["transactionsByPaymentHash"] or []
+            except (KeyError, TypeError):
+                continue
+            statuses[payment_hash] = next(
+                (transaction["status"] for transaction in transactions if transaction.get("direction") == "SEND"), None
+            )
+    return statuses
+
+def default_journal_path(auth_token):
+    return os.path.join(get_cache_dir(), f"payments-{api_key_fingerprint(auth_token)}.db")
+
+class PaymentJournal:
+    """Durable record of every payment attempt, keyed by payment hash.
+
+    Each send is committed as SENDING before the mutation is submitted and
+    updated with the outcome afterwards, so after a crash only the entries
+    still in flight need to be reconciled against the transaction list."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _event(self, payment_hash, status, detail, now):
+        self.conn.execute(
+            "INSERT INTO events (payment_hash, status, detail, at) VALUES (?, ?, ?, ?)",
+            (payment_hash, status, detail, now),
+        )
+
+    def get(self, payment_hash):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM payments WHERE payment_hash = ?", (payment_hash,)).fetchone()
+        return dict(row) if row else None
+
+    def begin(self, payment_hash, payment_request, amount=None):
+        # The insert is the duplicate check: one primary-key probe, atomic
+        # across threads and processes sharing the journal file.
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self.conn.execute(
+                    "INSERT INTO payments (payment_hash, payment_request, amount, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 'SENDING', ?, ?) "
+                    "ON CONFLICT (payment_hash) DO UPDATE SET status = 'SENDING', error = NULL, "
+                    "attempts = attempts + 1, updated_at = excluded.updated_at "
+                    f"WHERE payments.status IN ({', '.join('?' * len(RETRYABLE_STATUSES))})",
+                    (payment_hash, payment_request, amount, now, now, *RETRYABLE_STATUSES),
+                )
+                if cursor.rowcount == 0:
+                    row = self.conn.execute("SELECT * FROM payments WHERE payment_hash = ?", (payment_hash,)).fetchone()
+                    self.conn.execute("ROLLBACK")
+                    raise DuplicatePaymentError(dict(row))
+                self._event(payment_hash, "SENDING", None, now)
+                self.conn.execute("COMMIT")
+            except sqlite3.Error:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def claim_item(self, key, destination, amount=None):
+        """Claims a batch row that pays an LNURL or lightning address before
+        its invoice is fetched. Each fetch returns a new invoice, so the
+        payment hash alone cannot stop a rerun from paying the row twice.
+        Returns the journaled payment if the row was already paid or is in
+        flight, otherwise None."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT payment_hash FROM batch_items WHERE key = ?", (key,)).fetchone()
+                if row is not None and row["payment_hash"] is not None:
+                    payment = self.conn.execute("SELECT * FROM payments WHERE payment_hash = ?", (row["payment_hash"],)).fetchone()
+                    # No payment row means the invoice was fetched but never sent.
+                    if payment is not None and payment["status"] not in RETRYABLE_STATUSES:
+                        self.conn.execute("ROLLBACK")
+                        return dict(payment)
+                self.conn.execute(
+                    "INSERT INTO batch_items (key, destination, amount, payment_hash, updated_at) VALUES (?, ?, ?, NULL, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET payment_hash = NULL, updated_at = excluded.updated_at",
+                    (key, destination, amount, now),
+                )
+                self.conn.execute("COMMIT")
+            except sqlite3.Error:
+                self.conn.execute("ROLLBACK")
+                raise
+        return None
+
+    def attach_item(self, key, payment_hash):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE batch_items SET payment_hash = ?, updated_at = ? WHERE key = ?",
+                (payment_hash, time.time(), key),
+            )
+
+    def finish(self, payment_hash, status, error=None):
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute(
+                "UPDATE payments SET status = ?, error = ?, updated_at = ? WHERE payment_hash = ?",
+                (status, error, now, payment_hash),
+            )
+            self._event(payment_hash, status, error, now)
+            self.conn.execute("COMMIT")
+
+    def in_flight(self):
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM payments WHERE status IN ({', '.join('?' * len(IN_FLIGHT_STATUSES))}) ORDER BY created_at",
+                IN_FLIGHT_STATUSES,
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def reconcile(self, auth_token, wallet_id=None, grace=DEFAULT_RECONCILE_GRACE):
+        entries = self.in_flight()
+        if not entries:
+            return []
+        wallet_id = wallet_id or get_wallet_id(auth_token)
+        if not wallet_id:
+            raise Exception("BTC wallet not found")
+        statuses = fetch_send_statuses(auth_token, wallet_id, [entry["payment_hash"] for entry in entries])
+        results = []
+        for entry in entries:
+            if entry["payment_hash"] not in statuses:
+                # The lookup failed; nothing is known, so nothing changes.
+                status, error = entry["status"], None
+            elif statuses[entry["payment_hash"]] is not None:
+                status = TRANSACTION_STATUSES.get(statuses[entry["payment_hash"]], "PENDING")
+                error = None
+            elif time.time() - entry["updated_at"] > grace:
+                # No transaction on the account: the mutation never ran.
+                status, error = "FAILED", "Not found in transaction history"
+            else:
+                status, error = entry["status"], None
+            if status != entry["status"]:
+                self.finish(entry["payment_hash"], status, error)
+            results.append(dict(entry, status=status, error=error))
+        return results
+
+def open_payment_journal(auth_token):
+    if os.getenv("BLINK_PAYMENT_JOURNAL", "1") == "0":
+        return None
+    return PaymentJournal(os.getenv("BLINK_PAYMENT_JOURNAL_PATH") or default_journal_path(auth_token))
@@ -0,0 +1,230 @@
+import os
+import json
+import threading
+import importlib.util
+from collections import OrderedDict
+from blink_client import graphql_request
+from wallet_cache import get_wallet_id
+
+WEBSOCKET_URL = "wss://ws.blink.sv/graphql"
+DEFAULT_MIN_INTERVAL = 1
+DEFAULT_MAX_INTERVAL = 30
+BACKOFF_FACTOR = 1.5
+MAX_COMPLETED = 10000
+
+INVOICE_FINAL_STATUSES = ("PAID", "EXPIRED")
+PAYMENT_FINAL_STATUSES = ("SUCCESS", "FAILURE")
+
+MY_UPDATES_SUBSCRIPTION = """
+subscription myUpdates {
+  myUpdates {
+    update {
+      ... on LnUpdate {
+        paymentHash
+        status
+      }
+    }
+  }
+}
+"""
+
+class WatchedPayment:
+    def __init__(self, payment_hash, kind, payment_request=None, callback=None):
+        self.payment_hash = payment_hash
+        self.kind = kind
+        self.payment_request = payment_request
+        self.callback = callback
+        self.status = None
+        self.done = threading.Event()
+
+    def final_statuses(self):
+        return INVOICE_FINAL_STATUSES if self.kind == "invoice" else PAYMENT_FINAL_STATUSES
+
+class PaymentWatcher:
+    def __init__(self, auth_token, use_websocket=True, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL):
+        self.auth_token = auth_token
+        self.use_websocket = use_websocket and importlib.util.find_spec("websocket") is not None
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.watched = {}
+        self.completed = OrderedDict()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.websocket_connected = threading.Event()
+        self.threads = []
+
+    def start(self):
+        if self.threads:
+            return self
+        poller = threading.Thread(target=self._poll_loop, name="blink-poller", daemon=True)
+        poller.start()
+        self.threads.append(poller)
+        if self.use_websocket:
+            listener = threading.Thread(target=self._websocket_loop, name="blink-websocket", daemon=True)
+            listener.start()
+            self.threads.append(listener)
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.threads = []
+
+    def watch_invoice(self, payment_hash, payment_request, callback=None):
+        return self._watch(WatchedPayment(payment_hash, "invoice", payment_request, callback))
+
+    def watch_payment(self, payment_hash, callback=None):
+        return self._watch(WatchedPayment(payment_hash, "payment", callback=callback))
+
+    def _watch(self, watched):
+        with self.lock:
+            self.watched[watched.payment_hash] = watched
+            self.interval = self.min_interval
+        self.wakeup.set()
+        self.start()
+        return watched
+
+    def wait(self, payment_hash, timeout=None):
+        with self.lock:
+            watched = self.watched.get(payment_hash)
+            if watched is None:
+                return self.completed.get(payment_hash)
+        watched.done.wait(timeout)
+        return watched.status
+
+    def pending(self):
+        with self.lock:
+            return [watched for watched in self.watched.values() if not watched.done.is_set()]
+
+    def _update(self, payment_hash, status):
+        with self.lock:
+            watched = self.watched.get(payment_hash)
+            if watched is None or watched.done.is_set() or status is None:
+                return False
+            changed = status != watched.status
+            watched.status = status
+            finished = status in watched.final_statuses()
+            if finished:
+                del self.watched[payment_hash]
+                self.completed[payment_hash] = status
+                while len(self.completed) > MAX_COMPLETED:
+                    self.completed.popitem(last=False)
+        if finished:
+            watched.done.set()
+            if watched.callback:
+                try:
+                    watched.callback(payment_hash, status)
+                except Exception as e:
+                    print("Payment watcher callback failed:", e)
+        return changed
+
+    def _build_status_query(self, pending):
+        variable_definitions = []
+        fields = []
+        variables = {}
+        wallet_id = None
+        for index, watched in enumerate(pending):
+            alias = f"p{index}"
+            if watched.kind == "invoice":
+                variable_definitions.append(f"${alias}: LnInvoicePaymentStatusInput!")
+                fields.append(f"  {alias}: lnInvoicePaymentStatus(input: ${alias}) {{ status }}")
+                variables[alias] = {"paymentRequest": watched.payment_request}
+            else:
+                if wallet_id is None:
+                    wallet_id = get_wallet_id(self.auth_token)
+                    variable_definitions.append("$walletId: WalletId!")
+                    variables["walletId"] = wallet_id
+                variable_definitions.append(f"${alias}: PaymentHash!")
+                fields.append(
+                    f"  {alias}: me {{ defaultAccount {{ walletById(walletId: $walletId) {{ "
+                    f"transactionsByPaymentHash(paymentHash: ${alias}) {{ status direction }} }} }} }}"
+                )
+                variables[alias] = watched.payment_hash
+        query = "query paymentStatuses(" + ", ".join(variable_definitions) + ") {\n" + "\n".join(fields) + "\n}\n"
+        return query, variables
+
+    def _extract_status(self, watched, result):
+        if result is None:
+            return None
+        if watched.kind == "invoice":
+            return result.get("status")
+        transactions = result["defaultAccount"]["walletById"]["transactionsByPaymentHash"] or []
+        for transaction in transactions:
+            if transaction.get("direction") == "SEND":
+                return transaction.get("status")
+        return None
+
+    def poll_once(self):
+        pending = self.pending()
+        if not pending:
+            return False
+        query, variables = self._build_status_query(pending)
+        response = graphql_request(self.auth_token, query, variables)
+        if response.status_code != 200:
+            print("Failed to poll payment statuses. Status code:", response.status_code)
+            return False
+        data = response.json().get("data") or {}
+        changed = False
+        for index, watched in enumerate(pending):
+            status = self._extract_status(watched, data.get(f"p{index}"))
+            changed = self._update(watched.payment_hash, status) or changed
+        return changed
+
+    def _poll_loop(self):
+        while not self.stopped.is_set():
+            try:
+                changed = self.poll_once()
+            except Exception as e:
+                print("Payment status poll failed:", e)
+                changed = False
+            with self.lock:
+                if changed:
+                    self.interval = self.min_interval
+                else:
+                    self.interval = min(self.interval * BACKOFF_FACTOR, self.max_interval)
+                # The subscription delivers updates, polling is only a safety net then.
+                interval = self.max_interval if self.websocket_connected.is_set() else self.interval
+            self.wakeup.wait(interval)
+            self.wakeup.clear()
+
+    def _websocket_loop(self):
+        import websocket
+        url = os.getenv("BLINK_WEBSOCKET_URL", WEBSOCKET_URL)
+        retry_delay = self.min_interval
+        while not self.stopped.is_set():
+            try:
+                connection = websocket.create_connection(url, subprotocols=["graphql-transport-ws"], timeout=self.max_interval)
+                try:
+                    connection.send(json.dumps({"type": "connection_init", "payload": {"X-API-KEY": self.auth_token}}))
+                    if json.loads(connection.recv()).get("type") != "connection_ack":
+                        raise Exception("Subscription connection was not acknowledged")
+                    connection.send(json.dumps({"id": "1", "type": "subscribe", "payload": {"query": MY_UPDATES_SUBSCRIPTION}}))
+                    self.websocket_connected.set()
+                    retry_delay = self.min_interval
+                    while not self.stopped.is_set():
+                        try:
+                            message = json.loads(connection.recv())
+                        except websocket.WebSocketTimeoutException:
+                            continue
+                        if message.get("type") == "ping":
+                            connection.send(json.dumps({"type": "pong"}))
+                        elif message.get("type") == "next":
+                            update = ((message.get("payload") or {}).get("data") or {}).get("myUpdates", {}).get("update") or {}
+                            if update.get("paymentHash"):
+                                self._update(update["paymentHash"], update.get("status"))
+                        elif message.get("type") in ("error", "complete"):
+                            raise Exception(f"Subscription ended: {message}")
+                finally:
+                    self.websocket_connected.clear()
+                    connection.close()
+            except Exception as e:
+                if self.stopped.is_set():
+                    return
+                print("Payment subscription unavailable, falling back to polling:", e)
+                self.wakeup.set()
+                self.stopped.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, self.max_interval)
@@ -1,96 +1,337 @@
 import os
+import re
+import sys
+import time
+import argparse
+import threading
+from decimal import Decimal
+from fractions import Fraction
 import requests
+from blink_client import graphql_request, STAGING_GRAPHQL_URL
 from dotenv import load_dotenv
 
 load_dotenv()
 auth_token = os.getenv("API_KEY")
 
+DEFAULT_PRICE_MAX_AGE = 60
+# Codes become GraphQL aliases and variable names, which cannot start with a digit.
+CURRENCY_CODE_PATTERN = re.compile(r"[A-Z][A-Z0-9]*")
+
 minor_unit_mapping = {
     "USD": 100,
     "EUR": 100,
     "GBP": 100,
     "TRY": 100,
+    "BIF": 1,
+    "CLP": 1,
+    "DJF": 1,
+    "GNF": 1,
+    "ISK": 1,
+    "JPY": 1,
+    "KMF": 1,
+    "KRW": 1,
+    "PYG": 1,
+    "RWF": 1,
+    "UGX": 1,
+    "VND": 1,
+    "VUV": 1,
+    "XAF": 1,
+    "XOF": 1,
+    "XPF": 1,
+    "BHD": 1000,
+    "IQD": 1000,
+    "JOD": 1000,
+    "KWD": 1000,
+    "LYD": 1000,
+    "OMR": 1000,
+    "TND": 1000,
 }
 
-def convert_satoshi(satoshi_amount, currency):
-    currency = currency.upper()
-    if currency == "BTC":
-        btc_amount = satoshi_amount / 1e8
-        print(f"{satoshi_amount:.0f} satoshi is equal to {btc_amount:.8f} BTC.")
-        return
-
-    url = "https://api.staging.blink.sv/graphql"
-    headers = {
-        "Content-Type": "application/json",
-        "X-API-KEY": auth_token,
+REALTIME_PRICE_QUERY = """
+query realtimePrice($currency: DisplayCurrency) {
+  realtimePrice(currency: $currency) {
+    btcSatPrice {
+      base
+      offset
+    }
+    denominatorCurrencyDetails {
+      symbol
+    }
+  }
+}
+"""
+
+REALTIME_PRICE_FIELDS = """
+    btcSatPrice {
+      base
+      offset
     }
-    query = """
-    query realtimePrice($currency: DisplayCurrency) {
-      realtimePrice(currency: $currency) {
-        btcSatPrice {
-          base
-          offset
-        }
-        denominatorCurrencyDetails {
-          symbol
-        }
-      }
+    denominatorCurrencyDetails {
+      symbol
     }
-    """
-    variables = {"currency": currency}
+"""
+
+_quote_cache = {}
+_quote_lock = threading.Lock()
+
+def get_price_max_age():
+    return float(os.getenv("BLINK_PRICE_MAX_AGE", DEFAULT_PRICE_MAX_AGE))
+
+def cached_quote(currency, max_age=None):
+    if max_age is None:
+        max_age = get_price_max_age()
+    with _quote_lock:
+        entry = _quote_cache.get(currency)
+    if entry and time.monotonic() - entry[0] <= max_age:
+        return entry[1]
+    return None
+
+def store_quote(currency, quote):
+    with _quote_lock:
+        _quote_cache[currency] = (time.monotonic(), quote)
+    return quote
+
+def clear_price_cache():
+    with _quote_lock:
+        _quote_cache.clear()
+
+def convert_btc(satoshi_amount):
+    btc_amount = satoshi_amount / 1e8
+    print(f"{satoshi_amount:.0f} satoshi is equal to {btc_amount:.8f} BTC.")
+    return btc_amount
+
+def minor_digits(currency):
+    if currency == "BTC":
+        return 8
+    return len(str(minor_unit_mapping.get(currency, 100))) - 1
+
+def parse_realtime_price(realtime_price, currency):
+    btc_sat_price = realtime_price.get("btcSatPrice")
+    if btc_sat_price is None or btc_sat_price.get("base") is None or btc_sat_price.get("offset") is None:
+        print("Failed to retrieve satoshi price information.")
+        return None
 
     try:
-        response = requests.post(url, json={"query": query, "variables": variables}, headers=headers)
-    except requests.RequestException as e:
-        print("Error during API request:", e)
-        return
+        base = Fraction(Decimal(str(btc_sat_price["base"])))
+        offset = int(btc_sat_price["offset"])
+    except (ArithmeticError, ValueError, TypeError):
+        print("Price information is not in the expected format.")
+        return None
+
+    # Exact price of one satoshi in the currency's minor unit, e.g. cents per sat.
+    minor_per_sat = base / (10 ** offset)
+    symbol = (realtime_price.get("denominatorCurrencyDetails") or {}).get("symbol", currency)
+    return minor_per_sat, symbol
 
+def parse_json_response(response):
     if response.status_code != 200:
         print("Request failed with status code:", response.status_code)
         print("Response:", response.text)
-        return
+        return None
 
     try:
-        data = response.json()
+        return response.json()
     except ValueError:
         print("Failed to parse JSON response.")
-        return
+        return None
 
-    realtime_price = data.get("data", {}).get("realtimePrice")
+def parse_realtime_price_response(response, currency):
+    data = parse_json_response(response)
+    if data is None:
+        return None
+
+    realtime_price = (data.get("data") or {}).get("realtimePrice")
     if realtime_price is None:
         print("Unexpected response format:", data)
-        return
+        return None
+    return parse_realtime_price(realtime_price, currency)
 
-    btc_sat_price = realtime_price.get("btcSatPrice")
-    if btc_sat_price is None or btc_sat_price.get("base") is None or btc_sat_price.get("offset") is None:
-        print("Failed to retrieve satoshi price information.")
-        return
+def build_price_query(currencies):
+    for currency in currencies:
+        if not CURRENCY_CODE_PATTERN.fullmatch(currency):
+            raise ValueError(f"Invalid currency code: {currency}")
+    variable_definitions = ", ".join(f"${currency}: DisplayCurrency" for currency in currencies)
+    fields = "".join(
+        f"  {currency}: realtimePrice(currency: ${currency}) {{{REALTIME_PRICE_FIELDS}  }}\n"
+        for currency in currencies
+    )
+    query = f"query realtimePrices({variable_definitions}) {{\n{fields}}}\n"
+    variables = {currency: currency for currency in currencies}
+    return query, variables
 
+def fetch_price_quotes(currencies):
+    query, variables = build_price_query(currencies)
     try:
-        base = float(btc_sat_price["base"])
-        offset = int(btc_sat_price["offset"])
-    except (ValueError, TypeError):
-        print("Price information is not in the expected format.")
-        return
+        response = graphql_request(auth_token, query, variables, url=STAGING_GRAPHQL_URL)
+    except requests.RequestException as e:
+        print("Error during API request:", e)
+        return {}
 
-    price_per_sat_minor = base / (10 ** offset)
-    divisor = minor_unit_mapping.get(currency, 100)
-    price_per_sat = price_per_sat_minor / divisor
+    data = parse_json_response(response)
+    if data is None:
+        return {}
 
-    converted_value = satoshi_amount * price_per_sat
-    symbol = realtime_price.get("denominatorCurrencyDetails", {}).get("symbol", currency)
-    print(f"{satoshi_amount:.0f} satoshi is approximately {symbol}{converted_value:.2f} {currency}.")
+    results = data.get("data") or {}
+    quotes = {}
+    for currency in currencies:
+        realtime_price = results.get(currency)
+        if realtime_price is None:
+            print(f"No price returned for {currency}:", data.get("errors"))
+            continue
+        quote = parse_realtime_price(realtime_price, currency)
+        if quote is not None:
+            quotes[currency] = store_quote(currency, quote)
+    return quotes
 
-if __name__ == "__main__":
+def get_price_quotes(currencies, max_age=None):
+    quotes = {}
+    missing = []
+    for currency in dict.fromkeys(currency.upper() for currency in currencies):
+        if currency == "BTC":
+            continue
+        quote = cached_quote(currency, max_age)
+        if quote is None:
+            missing.append(currency)
+        else:
+            quotes[currency] = quote
+    if missing:
+        quotes.update(fetch_price_quotes(missing))
+    return quotes
+
+def round_half_even(numerator, denominator):
+    quotient, remainder = divmod(numerator, denominator)
+    if 2 * remainder > denominator or (2 * remainder == denominator and quotient % 2 == 1):
+        quotient += 1
+    return quotient
+
+def whole_satoshis(amount):
+    # int() would truncate 1.5 sats to 1 instead of rejecting it.
+    if amount != int(amount):
+        raise ValueError("Satoshi amounts must be whole numbers")
+    return int(amount)
+
+def convert_to_minor_units(satoshi_amounts, minor_per_sat):
+    numerator, denominator = minor_per_sat.numerator, minor_per_sat.denominator
+    # NumPy is only imported when the caller already passed an array.
+    if type(satoshi_amounts).__module__ == "numpy" and type(satoshi_amounts).__name__ == "ndarray":
+        import numpy as np
+        amounts = satoshi_amounts
+        if amounts.dtype.kind == "f":
+            if not np.all(np.mod(amounts, 1) == 0):
+                raise ValueError("Satoshi amounts must be whole numbers")
+            amounts = amounts.astype(np.int64)
+        largest = int(np.abs(amounts).max()) if amounts.size else 0
+        if largest * numerator >= 2 ** 62 or denominator >= 2 ** 62:
+            # Too large for int64 arithmetic, fall back to Python integers.
+            amounts = amounts.astype(object)
+        else:
+            amounts = amounts.astype(np.int64)
+        scaled = amounts * numerator
+        quotient, remainder = scaled // denominator, scaled % denominator
+        twice_remainder = 2 * remainder
+        round_up = (twice_remainder > denominator) | ((twice_remainder == denominator) & (quotient % 2 == 1))
+        return quotient + round_up.astype(np.int64)
+    return [round_half_even(whole_satoshis(amount) * numerator, denominator) for amount in satoshi_amounts]
+
+def minor_to_decimal(minor_amount, currency):
+    return Decimal(int(minor_amount)).scaleb(-minor_digits(currency))
+
+def apply_price(satoshi_amount, currency, quote):
+    minor_per_sat, symbol = quote
+    minor_amount = convert_to_minor_units([satoshi_amount], minor_per_sat)[0]
+    converted_value = minor_to_decimal(minor_amount, currency)
+    print(f"{satoshi_amount:.0f} satoshi is approximately {symbol}{converted_value} {currency}.")
+    return converted_value
+
+def convert_satoshi(satoshi_amount, currency, max_age=None):
+    currency = currency.upper()
+    if currency == "BTC":
+        return convert_btc(satoshi_amount)
+
+    quote = get_price_quotes([currency], max_age).get(currency)
+    if quote is None:
+        return None
+    return apply_price(satoshi_amount, currency, quote)
+
+def decimal_to_minor(amount, currency):
     try:
-        satoshi_input = float(input("Enter satoshi amount: "))
-    except ValueError:
-        print("Invalid number.")
-        exit(1)
+        minor_amount = Decimal(str(amount)).scaleb(minor_digits(currency))
+    except ArithmeticError:
+        raise ValueError(f"Invalid amount: {amount}")
+    if not minor_amount.is_finite() or minor_amount <= 0:
+        raise ValueError(f"Invalid amount: {amount}")
+    if minor_amount != minor_amount.to_integral_value():
+        raise ValueError(f"{currency} amounts have at most {minor_digits(currency)} decimal places")
+    return int(minor_amount)
 
-    currency_input = input("Enter target currency (e.g. BTC, USD, GBP, EUR, TRY): ").strip().upper()
-    if not currency_input:
-        print("No valid currency code provided.")
-        exit(1)
+def minor_to_satoshis(minor_amount, minor_per_sat):
+    # Rounded up, so the invoice never falls short of the fiat price.
+    return -(-minor_amount * minor_per_sat.denominator // minor_per_sat.numerator)
+
+def fiat_to_satoshis(amount, currency, max_age=None):
+    """Returns (satoshis, symbol) for an amount in a display currency, or
+    None when no price is available. A cached quote younger than max_age
+    is used without a round trip."""
+    currency = currency.upper()
+    minor_amount = decimal_to_minor(amount, currency)
+    if currency == "BTC":
+        return minor_amount, ""
+    quote = get_price_quotes([currency], max_age).get(currency)
+    if quote is None:
+        return None
+    minor_per_sat, symbol = quote
+    if minor_per_sat <= 0:
+        print(f"Price for {currency} is not usable:", minor_per_sat)
+        return None
+    return minor_to_satoshis(minor_amount, minor_per_sat), symbol
 
-    convert_satoshi(satoshi_input, currency_input)
+# Results are integer minor units (cents, yen, fils, or sats for BTC) in the same
+# container type as the input, or None when a currency's price is unavailable.
+def convert_satoshi_bulk(satoshi_amounts, currencies, max_age=None):
+    currencies = [currency.upper() for currency in currencies]
+    quotes = get_price_quotes(currencies, max_age)
+    results = {}
+    for currency in currencies:
+        if currency == "BTC":
+            results[currency] = convert_to_minor_units(satoshi_amounts, Fraction(1))
+        elif currency in quotes:
+            results[currency] = convert_to_minor_units(satoshi_amounts, quotes[currency][0])
+        else:
+            results[currency] = None
+    return results
+
+def add_arguments(parser):
+    parser.add_argument("amount", nargs="?", type=float, help="Amount in satoshis")
+    parser.add_argument("currencies", nargs="*", help="Target currencies, e.g. USD EUR BTC")
+
+def run(args):
+    satoshi_input = args.amount
+    if satoshi_input is None:
+        try:
+            satoshi_input = float(input("Enter satoshi amount: "))
+        except ValueError:
+            print("Invalid number.")
+            return 1
+    if not satoshi_input.is_integer():
+        print("Satoshi amounts must be whole numbers.")
+        return 1
+
+    currencies = [currency.strip().upper() for currency in args.currencies if currency.strip()]
+    if not currencies:
+        currency_input = input("Enter target currency (e.g. BTC, USD, GBP, EUR, TRY): ").strip().upper()
+        if not currency_input:
+            print("No valid currency code provided.")
+            return 1
+        currencies = [currency_input]
+
+    if len(currencies) > 1:
+        # Fetch every quote in one request before printing each conversion.
+        get_price_quotes(currencies)
+    for currency in currencies:
+        convert_satoshi(satoshi_input, currency)
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert satoshis into other currencies.")
+    add_arguments(parser)
+    sys.exit(run(parser.parse_args()))
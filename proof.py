@@ -1,67 +1,50 @@
 import os
+import argparse
 from dotenv import load_dotenv
-import requests
+from transaction_index import TransactionIndex, default_index_path
+from bolt11 import payment_hash
 
 load_dotenv()
 auth_token = os.getenv("API_KEY")
 
-def check_payment_status(auth_token, payment_request):
-    url = "https://api.blink.sv/graphql"
-    headers = {
-        "content-type": "application/json",
-        "X-API-KEY": auth_token,
-    }
+def lookup_proof(index, value):
+    value = value.strip()
+    if len(value) == 64 and all(c in "0123456789abcdefABCDEF" for c in value):
+        return index.by_payment_hash(value.lower()) or index.by_preimage(value.lower())
+    try:
+        # Keyed on the hash, the lookup also matches the same invoice pasted
+        # in a different letter case.
+        return index.by_payment_hash(payment_hash(value))
+    except ValueError:
+        return index.by_payment_request(value)
 
-    query = """
-    query PaymentsWithProof($first: Int) {
-      me {
-        defaultAccount {
-          transactions(first: $first) {
-            edges {
-              node {
-                initiationVia {
-                  ... on InitiationViaLn {
-                    paymentRequest
-                    paymentHash
-                  }
-                }
-                settlementVia {
-                  ... on SettlementViaIntraLedger {
-                    preImage
-                  }
-                  ... on SettlementViaLn {
-                    preImage
-                  }
-                }
-                settlementAmount
-                status
-              }
-            }
-          }
-        }
-      }
-    }
-    """
+def check_payment_status(auth_token, payment_request, index_path=None):
+    index = TransactionIndex(index_path or default_index_path(auth_token))
+    try:
+        try:
+            index.sync(auth_token)
+        except Exception as e:
+            print("Could not sync transaction index:", str(e))
+        transaction = lookup_proof(index, payment_request)
+    finally:
+        index.close()
+    if transaction:
+        settlement_amount = transaction.get("settlementAmount", "N/A")
+        status = transaction.get("status", "N/A")
+        print(f"Amount (satoshis): {settlement_amount}")
+        print(f"Status: {status}")
+        return
+    print("No matching transaction found for the provided payment request.")
 
-    variables = {"first": 10}
+def add_arguments(parser):
+    parser.add_argument("payment_request", nargs="?", help="Lightning invoice, payment hash or preimage to look up")
 
-    response = requests.post(url, json={"query": query, "variables": variables}, headers=headers)
+def run(args):
+    payment_request = args.payment_request or input("Enter the Lightning Invoice, payment hash or preimage: ")
+    check_payment_status(auth_token, payment_request)
+    return 0
 
-    if response.status_code == 200:
-        data = response.json()
-        transactions = data["data"]["me"]["defaultAccount"]["transactions"]["edges"]
-        for transaction in transactions:
-            txn_payment_request = transaction["node"]["initiationVia"].get("paymentRequest", "N/A")
-            if txn_payment_request == payment_request:
-                settlement_amount = transaction["node"].get("settlementAmount", "N/A")
-                status = transaction["node"].get("status", "N/A")
-                print(f"Amount (satoshis): {settlement_amount}")
-                print(f"Status: {status}")
-                return
-        print("No matching transaction found for the provided payment request.")
-    else:
-        print("Failed to fetch transactions. Status code:", response.status_code)
-        print("Response:", response.text)
-
-payment_request = input("Enter the Lightning Invoice: ")
-check_payment_status(auth_token, payment_request)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look up the settlement of a Lightning payment.")
+    add_arguments(parser)
+    run(parser.parse_args())
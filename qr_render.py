@@ -0,0 +1,143 @@
+import zlib
+import struct
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import qrcode
+
+DEFAULT_BORDER = 4
+DEFAULT_SCALE = 8
+CACHE_SIZE = 1024
+PARALLEL_THRESHOLD = 8
+FORMATS = ("terminal", "ansi", "svg", "png")
+
+_rendered = OrderedDict()
+_rendered_lock = threading.Lock()
+
+def qr_payload(payment_request):
+    # Bech32 invoices are case-insensitive; upper case lets the QR code use the
+    # denser alphanumeric mode, which gives fewer modules and a faster encode.
+    if payment_request.lower().startswith(("lnbc", "lntb", "lnsb", "lnurl")):
+        return payment_request.upper()
+    return payment_request
+
+@lru_cache(maxsize=CACHE_SIZE)
+def qr_matrix(payment_request, border=DEFAULT_BORDER):
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        border=border,
+    )
+    qr.add_data(qr_payload(payment_request))
+    qr.make(fit=True)
+    return tuple(tuple(row) for row in qr.get_matrix())
+
+def render_terminal(matrix):
+    # Two module rows per text line. Dark modules are drawn in black on an
+    # explicit white background, as with render_ansi, so the code is never
+    # inverted on a light terminal theme; scanners reject inverted codes.
+    blocks = {(True, True): "█", (True, False): "▀", (False, True): "▄", (False, False): " "}
+    colors, reset = "\x1b[30;47m", "\x1b[0m"
+    lines = []
+    for y in range(0, len(matrix), 2):
+        top = matrix[y]
+        bottom = matrix[y + 1] if y + 1 < len(matrix) else [False] * len(top)
+        lines.append(colors + "".join(blocks[(upper, lower)] for upper, lower in zip(top, bottom)) + reset)
+    return "\n".join(lines) + "\n"
+
+def render_ansi(matrix):
+    dark, light, reset = "\x1b[40m  ", "\x1b[47m  ", "\x1b[0m"
+    return "".join("".join(dark if module else light for module in row) + reset + "\n" for row in matrix)
+
+def render_svg(matrix, scale=DEFAULT_SCALE):
+    size = len(matrix)
+    path = "".join(
+        f"M{x},{y}h1v1h-1z"
+        for y, row in enumerate(matrix)
+        for x, module in enumerate(row)
+        if module
+    )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'width="{size * scale}" height="{size * scale}" shape-rendering="crispEdges">'
+        f'<rect width="100%" height="100%" fill="#fff"/><path d="{path}" fill="#000"/></svg>'
+    )
+
+def png_chunk(chunk_type, data):
+    chunk = chunk_type + data
+    return struct.pack(">I", len(data)) + chunk + struct.pack(">I", zlib.crc32(chunk) & 0xFFFFFFFF)
+
+def render_png(matrix, scale=DEFAULT_SCALE):
+    # 1-bit greyscale PNG written directly, no imaging library needed.
+    size = len(matrix) * scale
+    raw = bytearray()
+    for row in matrix:
+        bits = "".join(("0" if module else "1") * scale for module in row)
+        bits += "0" * (-len(bits) % 8)
+        line = b"\x00" + int(bits, 2).to_bytes(len(bits) // 8, "big")
+        raw += line * scale
+    header = struct.pack(">IIBBBBB", size, size, 1, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + png_chunk(b"IHDR", header)
+        + png_chunk(b"IDAT", zlib.compress(bytes(raw), 9))
+        + png_chunk(b"IEND", b"")
+    )
+
+def render_uncached(payment_request, fmt="terminal", scale=DEFAULT_SCALE):
+    matrix = qr_matrix(payment_request)
+    if fmt == "terminal":
+        return render_terminal(matrix)
+    if fmt == "ansi":
+        return render_ansi(matrix)
+    if fmt == "svg":
+        return render_svg(matrix, scale)
+    if fmt == "png":
+        return render_png(matrix, scale)
+    raise ValueError(f"Unknown QR format: {fmt}. Choose one of {', '.join(FORMATS)}")
+
+def cached_render(key):
+    with _rendered_lock:
+        output = _rendered.get(key)
+        if output is not None:
+            _rendered.move_to_end(key)
+        return output
+
+def store_render(key, output):
+    with _rendered_lock:
+        _rendered[key] = output
+        while len(_rendered) > CACHE_SIZE:
+            _rendered.popitem(last=False)
+    return output
+
+def render(payment_request, fmt="terminal", scale=DEFAULT_SCALE):
+    key = (payment_request, fmt, scale)
+    output = cached_render(key)
+    if output is None:
+        output = store_render(key, render_uncached(payment_request, fmt, scale))
+    return output
+
+def _render_job(args):
+    return render_uncached(*args)
+
+def render_many(payment_requests, fmt="svg", scale=DEFAULT_SCALE, workers=None):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown QR format: {fmt}. Choose one of {', '.join(FORMATS)}")
+    results = {}
+    missing = []
+    for payment_request in dict.fromkeys(payment_requests):
+        output = cached_render((payment_request, fmt, scale))
+        if output is None:
+            missing.append(payment_request)
+        else:
+            results[payment_request] = output
+    if len(missing) < PARALLEL_THRESHOLD:
+        for payment_request in missing:
+            results[payment_request] = render(payment_request, fmt, scale)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            jobs = [(payment_request, fmt, scale) for payment_request in missing]
+            for payment_request, output in zip(missing, executor.map(_render_job, jobs, chunksize=16)):
+                results[payment_request] = store_render((payment_request, fmt, scale), output)
+    return [results[payment_request] for payment_request in payment_requests]
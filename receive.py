@@ -1,81 +1,58 @@
 import os
+import csv
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import requests
-import qrcode
+from blink_client import graphql_request
+from blink_operations import Operation, execute_operations
+from wallet_cache import get_wallet_id
+from price import fiat_to_satoshis
 
 load_dotenv()
 auth_token = os.getenv("API_KEY")
 
-def get_wallet_id(auth_token):
-    url = "https://api.blink.sv/graphql"
+DEFAULT_BULK_WORKERS = 4
+DEFAULT_BULK_CHUNK_SIZE = 25
+BULK_RESULT_FIELDS = ["amount", "memo", "paymentRequest", "paymentHash", "status", "error"]
+DEFAULT_POOL_SIZE = 5
+DEFAULT_POOL_MAX_AGE = 30 * 60
+DEFAULT_POOL_REFILL_INTERVAL = 60
+POOL_EXPIRY_MARGIN_MINUTES = 10
 
-    headers = {
-        "content-type": "application/json",
-        "X-API-KEY": auth_token,
-    }
-
-    query = """
-    query Me {
-      me {
-        defaultAccount {
-          wallets {
-            id
-            walletCurrency
-            balance
-          }
+INVOICE_CREATE_MUTATION = """
+mutation LnInvoiceCreate($input: LnInvoiceCreateInput!) {
+    lnInvoiceCreate(input: $input) {
+        invoice {
+            paymentRequest
+            paymentHash
+            paymentSecret
+            satoshis
         }
-      }
-    }
-    """
-
-    response = requests.post(url, json={"query": query}, headers=headers)
-
-    if response.status_code == 200:
-        data = response.json()
-        wallets = data["data"]["me"]["defaultAccount"]["wallets"]
-        for wallet in wallets:
-            if wallet["walletCurrency"] == "BTC":
-                return wallet["id"]
-        print("BTC wallet not found.")
-        return None
-    else:
-        print("Failed to fetch wallet ID. Status code:", response.status_code)
-        print("Response:", response.text)
-        return None
-
-def create_lightning_invoice(auth_token, wallet_id, amount_satoshis):
-    url = "https://api.blink.sv/graphql"
-    
-    headers = {
-        "content-type": "application/json",
-        "X-API-KEY": auth_token,
-    }
-
-    query = """
-    mutation LnInvoiceCreate($input: LnInvoiceCreateInput!) {
-        lnInvoiceCreate(input: $input) {
-            invoice {
-                paymentRequest
-                paymentHash
-                paymentSecret
-                satoshis
-            }
-            errors {
-                message
-            }
+        errors {
+            message
         }
     }
-    """
+}
+"""
 
+def invoice_create_variables(wallet_id, amount_satoshis, memo=None, expires_in=None):
     variables = {
         "input": {
             "amount": amount_satoshis,
             "walletId": wallet_id
         }
     }
+    if memo:
+        variables["input"]["memo"] = memo
+    if expires_in:
+        variables["input"]["expiresIn"] = expires_in
+    return variables
 
-    response = requests.post(url, json={"query": query, "variables": variables}, headers=headers)
-    
+def parse_invoice_create_response(response):
     if response.status_code == 200:
         data = response.json()
         if "errors" in data["data"]["lnInvoiceCreate"] and data["data"]["lnInvoiceCreate"]["errors"]:
@@ -87,29 +64,295 @@ def create_lightning_invoice(auth_token, wallet_id, amount_satoshis):
         print("Response:", response.text)
         return None
 
+def create_lightning_invoice(auth_token, wallet_id, amount_satoshis, memo=None, expires_in=None):
+    response = graphql_request(auth_token, INVOICE_CREATE_MUTATION, invoice_create_variables(wallet_id, amount_satoshis, memo, expires_in))
+    return parse_invoice_create_response(response)
+
+def create_fiat_invoice(auth_token, wallet_id, amount, currency, memo=None, max_age=None, expires_in=None):
+    # The quote cache in price.py is shared by every caller in the process,
+    # so a checkout only pays a price round trip once the quote is stale.
+    conversion = fiat_to_satoshis(amount, currency, max_age)
+    if conversion is None:
+        return None
+    amount_satoshis, symbol = conversion
+    invoice = create_lightning_invoice(auth_token, wallet_id, amount_satoshis, memo, expires_in)
+    if not invoice:
+        return None
+    return dict(invoice, fiatAmount=str(amount), currency=currency.upper(), symbol=symbol)
+
+def create_lightning_invoices(auth_token, wallet_id, invoice_requests, expires_in=None):
+    operations = [
+        Operation(INVOICE_CREATE_MUTATION, invoice_create_variables(wallet_id, amount_satoshis, memo, expires_in))
+        for amount_satoshis, memo in invoice_requests
+    ]
+    invoices = []
+    for response in execute_operations(auth_token, operations):
+        try:
+            invoices.append(parse_invoice_create_response(response))
+        except (KeyError, TypeError):
+            print("Unexpected invoice response:", response.text)
+            invoices.append(None)
+    return invoices
+
+def parse_invoice_request(line):
+    # Returns (amount, memo, error). A bad row is reported as FAILED in the
+    # output instead of stopping the rest of the file.
+    try:
+        row = json.loads(line) if isinstance(line, str) else line
+    except ValueError as e:
+        return None, None, f"Invalid JSON: {e}"
+    if not isinstance(row, dict):
+        return None, None, f"Invalid row: expected an object, got {type(row).__name__}"
+    amount, memo = row.get("amount"), row.get("memo") or None
+    try:
+        # int() would truncate 1.5 or "1.5" to 1 sat, so only whole numbers pass.
+        if isinstance(amount, bool):
+            raise ValueError
+        if isinstance(amount, float):
+            if not amount.is_integer():
+                raise ValueError
+        elif not isinstance(amount, (int, str)):
+            raise TypeError
+        amount_satoshis = int(amount.strip() if isinstance(amount, str) else amount)
+        if amount_satoshis <= 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return amount, memo, f"Invalid amount: {amount}"
+    return amount_satoshis, memo, None
+
+def load_invoice_requests(path):
+    with open(path, newline="") as f:
+        if path.endswith(".jsonl"):
+            rows = [line for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    return [parse_invoice_request(row) for row in rows]
+
+def run_bulk(auth_token, input_path, output_path, workers=DEFAULT_BULK_WORKERS, chunk_size=DEFAULT_BULK_CHUNK_SIZE, qr_dir=None, qr_format="svg"):
+    wallet_id = get_wallet_id(auth_token)
+    if not wallet_id:
+        return None
+    invoice_requests = load_invoice_requests(input_path)
+    valid_requests = [(amount, memo) for amount, memo, error in invoice_requests if error is None]
+    print(f"Creating {len(valid_requests)} invoices...")
+    chunks = [valid_requests[i:i + chunk_size] for i in range(0, len(valid_requests), chunk_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        chunk_results = list(executor.map(lambda chunk: create_lightning_invoices(auth_token, wallet_id, chunk), chunks))
+    created_invoices = iter([invoice for chunk in chunk_results for invoice in chunk])
+
+    created = 0
+    invoices = []
+    with open(output_path, "w", newline="") as f:
+        writer = None
+        if output_path.endswith(".csv"):
+            writer = csv.DictWriter(f, fieldnames=BULK_RESULT_FIELDS)
+            writer.writeheader()
+        for amount_satoshis, memo, error in invoice_requests:
+            row = {"amount": amount_satoshis, "memo": memo, "paymentRequest": None, "paymentHash": None,
+                   "status": "FAILED", "error": error}
+            invoice = next(created_invoices) if error is None else None
+            if invoice:
+                row.update({"paymentRequest": invoice["paymentRequest"], "paymentHash": invoice["paymentHash"], "status": "CREATED"})
+                invoices.append(invoice)
+                created += 1
+            if writer:
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(row) + "\n")
+    print(f"Created {created} of {len(invoice_requests)} invoices, written to {output_path}")
+    if qr_dir and invoices:
+        write_qr_codes(invoices, qr_dir, qr_format)
+        print(f"QR codes written to {qr_dir}")
+    return created
+
+class InvoicePool:
+    def __init__(self, auth_token, wallet_id, amounts, pool_size=DEFAULT_POOL_SIZE, max_age=DEFAULT_POOL_MAX_AGE, refill_interval=DEFAULT_POOL_REFILL_INTERVAL):
+        self.auth_token = auth_token
+        self.wallet_id = wallet_id
+        self.pool_size = pool_size
+        self.max_age = max_age
+        self.refill_interval = refill_interval
+        self.pools = {amount: deque() for amount in amounts}
+        self.lock = threading.Lock()
+        self.refill_needed = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._refill_loop, name="blink-invoice-pool", daemon=True)
+            self.thread.start()
+        self.refill_needed.set()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.refill_needed.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def _discard_stale(self, pool):
+        oldest = time.monotonic() - self.max_age
+        while pool and pool[0][0] < oldest:
+            pool.popleft()
+
+    def take(self, amount_satoshis):
+        with self.lock:
+            pool = self.pools.get(amount_satoshis)
+            if pool is not None:
+                self._discard_stale(pool)
+                if pool:
+                    invoice = pool.popleft()[1]
+                    self.refill_needed.set()
+                    return invoice
+        return create_lightning_invoice(self.auth_token, self.wallet_id, amount_satoshis, expires_in=self.expires_in_minutes())
+
+    def expires_in_minutes(self):
+        # Leave a margin so a pooled invoice never expires in the customer's hands.
+        return int(self.max_age // 60) + POOL_EXPIRY_MARGIN_MINUTES
+
+    def missing(self):
+        requests = []
+        with self.lock:
+            for amount, pool in self.pools.items():
+                self._discard_stale(pool)
+                requests.extend((amount, None) for _ in range(self.pool_size - len(pool)))
+        return requests
+
+    def refill(self):
+        invoice_requests = self.missing()
+        if not invoice_requests:
+            return 0
+        invoices = create_lightning_invoices(self.auth_token, self.wallet_id, invoice_requests, expires_in=self.expires_in_minutes())
+        added = 0
+        now = time.monotonic()
+        with self.lock:
+            for (amount, _), invoice in zip(invoice_requests, invoices):
+                if invoice:
+                    self.pools[amount].append((now, invoice))
+                    added += 1
+        return added
+
+    def _refill_loop(self):
+        while not self.stopped.is_set():
+            try:
+                self.refill()
+            except Exception as e:
+                print("Invoice pool refill failed:", e)
+            self.refill_needed.wait(self.refill_interval)
+            self.refill_needed.clear()
+
 def display_qr_code(payment_request):
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(payment_request)
-    qr.make(fit=True)
-
-    img = qr.make_image(fill="black", back_color="white")
-    img.show()
-
-wallet_id = get_wallet_id(auth_token)
-if wallet_id:
-    amount_satoshis = int(input("Enter the amount in satoshis: "))
-    invoice = create_lightning_invoice(auth_token, wallet_id, amount_satoshis)
-
-    if invoice:
-        print("Invoice created successfully:")
-        print("Payment Request:", invoice["paymentRequest"])
-        print("Payment Hash:", invoice["paymentHash"])
-        print("Payment Secret:", invoice["paymentSecret"])
-        print("Satoshis:", invoice["satoshis"])
-
-        display_qr_code(invoice["paymentRequest"])
+    from qr_render import render
+    print(render(payment_request, "terminal"))
+
+def write_qr_codes(invoices, qr_dir, fmt):
+    from qr_render import render_many
+    os.makedirs(qr_dir, exist_ok=True)
+    payment_requests = [invoice["paymentRequest"] for invoice in invoices]
+    for invoice, output in zip(invoices, render_many(payment_requests, fmt)):
+        path = os.path.join(qr_dir, f"{invoice['paymentHash']}.{fmt}")
+        with open(path, "wb" if isinstance(output, bytes) else "w") as f:
+            f.write(output)
+
+def run_pool(auth_token, amounts, pool_size):
+    wallet_id = get_wallet_id(auth_token)
+    if not wallet_id:
+        return
+    pool = InvoicePool(auth_token, wallet_id, amounts, pool_size).start()
+    print("Invoice pool running for amounts:", ", ".join(str(amount) for amount in amounts))
+    try:
+        while True:
+            entry = input("Enter the amount in satoshis (empty to exit): ").strip()
+            if not entry:
+                break
+            try:
+                invoice = pool.take(int(entry))
+            except ValueError:
+                print("Please enter a valid number.")
+                continue
+            if invoice:
+                print("Payment Request:", invoice["paymentRequest"])
+                print("Payment Hash:", invoice["paymentHash"])
+    finally:
+        pool.stop()
+
+def print_invoice(invoice):
+    print("Invoice created successfully:")
+    print("Payment Request:", invoice["paymentRequest"])
+    print("Payment Hash:", invoice["paymentHash"])
+    print("Payment Secret:", invoice["paymentSecret"])
+    print("Satoshis:", invoice["satoshis"])
+    if invoice.get("currency"):
+        print(f"Price: {invoice['symbol']}{invoice['fiatAmount']} {invoice['currency']}")
+
+def main(currency=None, max_age=None):
+    wallet_id = get_wallet_id(auth_token)
+    if wallet_id:
+        if currency:
+            amount = input(f"Enter the amount in {currency.upper()}: ").strip()
+            invoice = create_fiat_invoice(auth_token, wallet_id, amount, currency, max_age=max_age)
+        else:
+            amount_satoshis = int(input("Enter the amount in satoshis: "))
+            invoice = create_lightning_invoice(auth_token, wallet_id, amount_satoshis)
+
+        if invoice:
+            print_invoice(invoice)
+
+            display_qr_code(invoice["paymentRequest"])
+
+            if input("Wait for the payment? (y/n): ").lower() == "y":
+                from payment_watcher import PaymentWatcher
+                watcher = PaymentWatcher(auth_token)
+                watcher.watch_invoice(invoice["paymentHash"], invoice["paymentRequest"])
+                print("Waiting for payment...")
+                status = watcher.wait(invoice["paymentHash"])
+                watcher.stop()
+                print("Invoice status:", status)
+
+def add_arguments(parser):
+    parser.add_argument("--amount", help="Create a single invoice for this many satoshis, or --currency units, without prompting")
+    parser.add_argument("--currency", help="Read amounts in this display currency (e.g. USD) and convert them to satoshis")
+    parser.add_argument("--price-max-age", type=float, default=None, help="Reuse a price quote up to this many seconds old")
+    parser.add_argument("--memo", help="Memo for the invoice created with --amount")
+    parser.add_argument("--bulk", help="CSV or JSONL file with amount and memo columns to create invoices for")
+    parser.add_argument("--output", default="invoices.jsonl", help="Results file for --bulk (.csv or .jsonl)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_BULK_WORKERS, help="Number of concurrent invoice requests")
+    parser.add_argument("--qr-dir", help="Directory to write a QR code per created invoice for --bulk")
+    parser.add_argument("--qr-format", choices=["svg", "png"], default="svg", help="QR code file format for --qr-dir")
+    parser.add_argument("--pool", help="Comma separated amounts to keep pre-created invoices for")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="Invoices to keep ready per pooled amount")
+
+def run(args):
+    if args.bulk:
+        run_bulk(auth_token, args.bulk, args.output, args.workers, qr_dir=args.qr_dir, qr_format=args.qr_format)
+    elif args.amount is not None:
+        wallet_id = get_wallet_id(auth_token)
+        if not wallet_id:
+            return 1
+        try:
+            if args.currency:
+                invoice = create_fiat_invoice(auth_token, wallet_id, args.amount, args.currency, args.memo, args.price_max_age)
+            else:
+                invoice = create_lightning_invoice(auth_token, wallet_id, int(args.amount), args.memo)
+        except ValueError as e:
+            print("Error:", e)
+            return 1
+        if not invoice:
+            return 1
+        print_invoice(invoice)
+    elif args.pool:
+        run_pool(auth_token, [int(amount) for amount in args.pool.split(",")], args.pool_size)
+    else:
+        try:
+            main(args.currency, args.price_max_age)
+        except ValueError as e:
+            print("Error:", e)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create Lightning invoices for your Blink wallet.")
+    add_arguments(parser)
+    run(parser.parse_args())
@@ -1,67 +1,54 @@
 import os
+import csv
+import hashlib
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import requests
-from urllib.parse import urlparse, urlunparse, urlencode, parse_qsl
+from blink_client import graphql_request, RoundTripCounter
+from wallet_cache import get_wallet_id
+from blink_operations import Operation, execute_operations
+from lnurl import get_resolver
+from bolt11 import check_invoice, payment_hash
+from payment_journal import DuplicatePaymentError, RETRYABLE_STATUSES, open_payment_journal
 
 load_dotenv()
 auth_token = os.getenv("API_KEY")
 
-def get_wallet_id(auth_token):
-    url = "https://api.blink.sv/graphql"
-    headers = {
-        "content-type": "application/json",
-        "X-API-KEY": auth_token,
+FEE_PROBE_MUTATION = """
+mutation lnInvoiceFeeProbe($input: LnInvoiceFeeProbeInput!) {
+  lnInvoiceFeeProbe(input: $input) {
+    errors {
+      message
     }
-    query = """
-    query Me {
-      me {
-        defaultAccount {
-          wallets {
-            id
-            walletCurrency
-            balance
-          }
-        }
-      }
-    }
-    """
-    response = requests.post(url, json={"query": query}, headers=headers)
-    if response.status_code == 200:
-        data = response.json()
-        wallets = data["data"]["me"]["defaultAccount"]["wallets"]
-        for wallet in wallets:
-            if wallet["walletCurrency"] == "BTC":
-                return wallet["id"]
-        print("BTC wallet not found.")
-        return None
-    else:
-        print("Failed to fetch wallet ID. Status code:", response.status_code)
-        print("Response:", response.text)
-        return None
+    amount
+  }
+}
+"""
 
-def probe_invoice_fee(auth_token, wallet_id, payment_request):
-    url = "https://api.blink.sv/graphql"
-    headers = {
-        "content-type": "application/json",
-        "X-API-KEY": auth_token,
+PAYMENT_SEND_MUTATION = """
+mutation LnInvoicePaymentSend($input: LnInvoicePaymentInput!) {
+  lnInvoicePaymentSend(input: $input) {
+    status
+    errors {
+      message
+      path
+      code
     }
-    query = """
-    mutation lnInvoiceFeeProbe($input: LnInvoiceFeeProbeInput!) {
-      lnInvoiceFeeProbe(input: $input) {
-        errors {
-          message
-        }
-        amount
-      }
-    }
-    """
-    variables = {
+  }
+}
+"""
+
+def payment_variables(wallet_id, payment_request):
+    return {
         "input": {
             "paymentRequest": payment_request,
             "walletId": wallet_id
         }
     }
-    response = requests.post(url, json={"query": query, "variables": variables}, headers=headers)
+
+def parse_fee_probe_response(response):
     if response.status_code == 200:
         data = response.json()
         result = data["data"]["lnInvoiceFeeProbe"]
@@ -76,31 +63,7 @@ def probe_invoice_fee(auth_token, wallet_id, payment_request):
         print("Response:", response.text)
         return None
 
-def pay_invoice(auth_token, wallet_id, payment_request):
-    url = "https://api.blink.sv/graphql"
-    headers = {
-        "content-type": "application/json",
-        "X-API-KEY": auth_token,
-    }
-    query = """
-    mutation LnInvoicePaymentSend($input: LnInvoicePaymentInput!) {
-      lnInvoicePaymentSend(input: $input) {
-        status
-        errors {
-          message
-          path
-          code
-        }
-      }
-    }
-    """
-    variables = {
-        "input": {
-            "paymentRequest": payment_request,
-            "walletId": wallet_id
-        }
-    }
-    response = requests.post(url, json={"query": query, "variables": variables}, headers=headers)
+def parse_payment_send_response(response):
     if response.status_code == 200:
         data = response.json()
         result = data["data"]["lnInvoicePaymentSend"]
@@ -108,71 +71,363 @@ def pay_invoice(auth_token, wallet_id, payment_request):
             print("Payment errors:", result["errors"])
         else:
             print("Payment status:", result["status"])
+        return result
     else:
         print("Failed to send payment. Status code:", response.status_code)
         print("Response:", response.text)
+        return None
+
+def probe_invoice_fee(auth_token, wallet_id, payment_request):
+    response = graphql_request(auth_token, FEE_PROBE_MUTATION, payment_variables(wallet_id, payment_request))
+    return parse_fee_probe_response(response)
+
+def probe_invoice_fees(auth_token, wallet_id, payment_requests):
+    operations = [Operation(FEE_PROBE_MUTATION, payment_variables(wallet_id, payment_request)) for payment_request in payment_requests]
+    fees = []
+    for response in execute_operations(auth_token, operations):
+        # A null or errored alias fails only its own row, not the chunk.
+        try:
+            fees.append(parse_fee_probe_response(response))
+        except (KeyError, TypeError):
+            print("Unexpected fee probe response:", response.text)
+            fees.append(None)
+    return fees
+
+def pay_invoice(auth_token, wallet_id, payment_request):
+    response = graphql_request(auth_token, PAYMENT_SEND_MUTATION, payment_variables(wallet_id, payment_request))
+    return parse_payment_send_response(response)
+
+def journal_outcome(payment):
+    if payment is None:
+        # No answer, so the payment may or may not have gone out.
+        return "SENDING", "No payment result received"
+    if payment["errors"]:
+        return "FAILED", "; ".join(error["message"] for error in payment["errors"])
+    if payment["status"] == "FAILURE":
+        return "FAILED", None
+    return payment["status"], None
+
+def pay_invoice_journaled(journal, auth_token, wallet_id, payment_request, amount=None):
+    if journal is None:
+        return pay_invoice(auth_token, wallet_id, payment_request)
+    invoice_hash = check_invoice(payment_request)["payment_hash"]
+    journal.begin(invoice_hash, payment_request, amount)
+    try:
+        payment = pay_invoice(auth_token, wallet_id, payment_request)
+    except Exception as e:
+        journal.finish(invoice_hash, "SENDING", str(e))
+        raise
+    journal.finish(invoice_hash, *journal_outcome(payment))
+    return payment
+
+def pay_and_report(journal, auth_token, wallet_id, payment_request):
+    try:
+        return pay_invoice_journaled(journal, auth_token, wallet_id, payment_request)
+    except DuplicatePaymentError as e:
+        print("Payment not sent:", str(e))
+    except ValueError as e:
+        print("Invalid invoice:", str(e))
+    return None
 
 def create_ln_invoice(amount_satoshis, lnurl, memo):
-    msat = amount_satoshis * 1000
-    if "@" in lnurl:
-        user, domain = lnurl.split("@", 1)
-        lnurlp = f"https://{domain}/.well-known/lnurlp/{user}"
-    else:
-        lnurlp = lnurl
-    response = requests.get(lnurlp)
-    if response.status_code != 200:
-        raise Exception(f"Could not fetch LNURL-pay info: {response.status_code}")
-    lnurl_data = response.json()
-    min_sendable = lnurl_data.get("minSendable", 0)
-    max_sendable = lnurl_data.get("maxSendable", 0)
-    if msat < min_sendable or msat > max_sendable:
-        raise Exception(f"Amount out of range. Minimum {min_sendable // 1000} and maximum {max_sendable // 1000} satoshis allowed.")
-    callback_url = lnurl_data.get("callback")
-    if not callback_url:
-        raise Exception("LNURL-pay info does not contain a callback URL")
-    parsed_url = urlparse(callback_url)
-    query_params = dict(parse_qsl(parsed_url.query))
-    query_params["amount"] = str(msat)
-    comment_allowed = lnurl_data.get("commentAllowed", 0)
-    if comment_allowed > 0:
-        if len(memo) > comment_allowed:
-            memo = memo[:comment_allowed]
-        query_params["comment"] = memo
-    new_query = urlencode(query_params)
-    new_callback_url = urlunparse((
-        parsed_url.scheme,
-        parsed_url.netloc,
-        parsed_url.path,
-        parsed_url.params,
-        new_query,
-        parsed_url.fragment
-    ))
-    invoice_response = requests.get(new_callback_url)
-    if invoice_response.status_code != 200:
-        raise Exception(f"Failed to fetch invoice: {invoice_response.status_code}")
-    invoice_data = invoice_response.json()
-    if invoice_data.get("status", "").lower() == "error":
-        raise Exception(f"Invoice error: {invoice_data.get('reason', 'Unknown error')}")
-    invoice = invoice_data.get("pr")
-    if not invoice:
-        raise Exception("No invoice found in response")
-    return invoice
+    return get_resolver().request_invoice(amount_satoshis, lnurl, memo)
 
-if __name__ == "__main__":
+DEFAULT_PAY_WORKERS = 4
+DEFAULT_PROBE_WORKERS = 16
+PROBE_CHUNK_SIZE = 25
+BOLT11_PREFIXES = ("lnbc", "lntb", "lnsb")
+RESULT_FIELDS = ["line", "destination", "amount", "payment_request", "payment_hash", "fee", "status", "error", "probe_ms", "pay_ms", "latency_ms"]
+
+def batch_file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+def parse_batch_amount(amount):
+    # int() would silently truncate 1.5 or "1.5" to 1 sat, so only whole
+    # numbers are accepted.
+    if isinstance(amount, bool):
+        raise ValueError
+    if isinstance(amount, float):
+        if not amount.is_integer():
+            raise ValueError
+        amount = int(amount)
+    elif isinstance(amount, str):
+        amount = int(amount.strip())
+    elif not isinstance(amount, int):
+        raise TypeError
+    if amount <= 0:
+        raise ValueError
+    return amount
+
+def read_jsonl_rows(f):
+    for line in f:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"Invalid JSON: {e}")
+
+def load_batch_items(path):
+    # Rows are keyed by file content and line, so rerunning the same batch
+    # file finds the rows an earlier run already paid.
+    file_hash = batch_file_hash(path)
+    items = []
+    with open(path, newline="") as f:
+        if path.endswith(".jsonl"):
+            rows = read_jsonl_rows(f)
+        else:
+            rows = csv.DictReader(f)
+        for line_number, row in enumerate(rows, start=1):
+            item = {
+                "key": f"{file_hash}:{line_number}",
+                "line": line_number,
+                "destination": "",
+                "amount": None,
+                "memo": "",
+                "error": None,
+            }
+            items.append(item)
+            # A malformed row fails on its own instead of aborting the payout.
+            if isinstance(row, ValueError):
+                item["error"] = str(row)
+                continue
+            if not isinstance(row, dict):
+                item["error"] = f"Invalid row: expected an object, got {type(row).__name__}"
+                continue
+            destination, amount, memo = row.get("destination"), row.get("amount"), row.get("memo")
+            if destination is not None and not isinstance(destination, str):
+                item["error"] = f"Invalid destination: {destination}"
+                continue
+            item["destination"] = (destination or "").strip()
+            item["memo"] = "" if memo is None else str(memo)
+            if amount not in (None, ""):
+                try:
+                    item["amount"] = parse_batch_amount(amount)
+                except (TypeError, ValueError):
+                    item["error"] = f"Invalid amount: {amount}"
+    return items
+
+def fee_within_limit(fee, amount, max_fee, max_fee_percent):
+    if max_fee is not None and fee > max_fee:
+        return False
+    if max_fee_percent is not None and amount:
+        if fee * 100 > amount * max_fee_percent:
+            return False
+    return True
+
+def resolve_batch_item(item, journal=None):
+    result = {field: None for field in RESULT_FIELDS}
+    result.update({"line": item["line"], "destination": item["destination"], "amount": item["amount"]})
+    start = time.monotonic()
+    try:
+        if item["error"]:
+            raise Exception(item["error"])
+        destination = item["destination"]
+        if destination.lower().startswith(BOLT11_PREFIXES):
+            payment_request = destination
+        else:
+            if not item["amount"]:
+                raise Exception("An amount is required for LNURL and lightning address payments")
+            if journal is not None:
+                entry = journal.claim_item(item["key"], destination, item["amount"])
+                if entry is not None:
+                    result["payment_hash"] = entry["payment_hash"]
+                    result["payment_request"] = entry["payment_request"]
+                    result["status"] = "DUPLICATE"
+                    result["error"] = f"Row already journaled with status {entry['status']}"
+                    result["probe_ms"] = round((time.monotonic() - start) * 1000, 1)
+                    return result
+            payment_request = create_ln_invoice(item["amount"], destination, item["memo"])
+            if journal is not None and payment_request:
+                try:
+                    journal.attach_item(item["key"], payment_hash(payment_request))
+                except ValueError:
+                    pass
+        result["payment_request"] = payment_request
+        result["status"] = "RESOLVED"
+    except Exception as e:
+        result["status"] = "FAILED"
+        result["error"] = str(e)
+    result["probe_ms"] = round((time.monotonic() - start) * 1000, 1)
+    return result
+
+def probe_batch_chunk(auth_token, wallet_id, results, max_fee, max_fee_percent):
+    start = time.monotonic()
+    try:
+        fees = probe_invoice_fees(auth_token, wallet_id, [result["payment_request"] for result in results])
+    except Exception as e:
+        fees = [None] * len(results)
+        print("Fee probe request failed:", str(e))
+    elapsed = (time.monotonic() - start) * 1000
+    for result, fee in zip(results, fees):
+        result["probe_ms"] = round(result["probe_ms"] + elapsed, 1)
+        if fee is None:
+            result["status"] = "FAILED"
+            result["error"] = "Invoice fee could not be retrieved"
+        elif not fee_within_limit(fee, result["amount"], max_fee, max_fee_percent):
+            result["fee"] = fee
+            result["status"] = "SKIPPED"
+            result["error"] = f"Fee {fee} exceeds the configured fee ceiling"
+        else:
+            result["fee"] = fee
+            result["status"] = "READY"
+    return results
+
+def check_batch_invoice(journal, result):
+    # Malformed, expired, amountless, wrong-network and already journaled
+    # invoices are dropped locally, before they cost a fee probe.
+    try:
+        invoice = check_invoice(result["payment_request"])
+    except ValueError as e:
+        result["status"] = "FAILED"
+        result["error"] = f"Invalid invoice: {e}"
+        return result
+    result["payment_hash"] = invoice["payment_hash"]
+    if result["amount"] is None:
+        result["amount"] = invoice["amount"]
+    if journal is not None:
+        entry = journal.get(result["payment_hash"])
+        if entry is not None and entry["status"] not in RETRYABLE_STATUSES:
+            result["status"] = "DUPLICATE"
+            result["error"] = f"Already journaled with status {entry['status']}"
+    return result
+
+def pay_batch_item(auth_token, wallet_id, result, journal=None):
+    start = time.monotonic()
+    try:
+        payment = pay_invoice_journaled(journal, auth_token, wallet_id, result["payment_request"], result["amount"])
+        if payment is None:
+            result["status"] = "FAILED"
+            result["error"] = "Payment request failed"
+        elif payment["errors"]:
+            result["status"] = "FAILED"
+            result["error"] = "; ".join(error["message"] for error in payment["errors"])
+        else:
+            result["status"] = payment["status"]
+    except DuplicatePaymentError as e:
+        result["status"] = "DUPLICATE"
+        result["error"] = str(e)
+    except Exception as e:
+        result["status"] = "FAILED"
+        result["error"] = str(e)
+    result["pay_ms"] = round((time.monotonic() - start) * 1000, 1)
+    return result
+
+def write_batch_results(path, results):
+    with open(path, "w", newline="") as f:
+        if path.endswith(".csv"):
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+        else:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+
+def run_batch(auth_token, batch_path, output_path, max_fee=None, max_fee_percent=None, workers=DEFAULT_PAY_WORKERS, probe_workers=DEFAULT_PROBE_WORKERS):
+    with RoundTripCounter() as round_trips:
+        results = _run_batch(auth_token, batch_path, output_path, max_fee, max_fee_percent, workers, probe_workers)
+    print("Round trips:", round_trips.count)
+    return results
+
+def _run_batch(auth_token, batch_path, output_path, max_fee, max_fee_percent, workers, probe_workers):
     wallet_id = get_wallet_id(auth_token)
+    if not wallet_id:
+        return None
+    items = load_batch_items(batch_path)
+    print(f"Loaded {len(items)} payments from {batch_path}")
+    journal = open_payment_journal(auth_token)
+    try:
+        return _run_journaled_batch(auth_token, wallet_id, items, output_path, max_fee, max_fee_percent, workers, probe_workers, journal)
+    finally:
+        if journal is not None:
+            journal.close()
+
+def _run_journaled_batch(auth_token, wallet_id, items, output_path, max_fee, max_fee_percent, workers, probe_workers, journal):
+    addresses = [item["destination"] for item in items if not item["error"] and not item["destination"].lower().startswith(BOLT11_PREFIXES)]
+    if addresses:
+        get_resolver().resolve_many(addresses)
+
+    with ThreadPoolExecutor(max_workers=probe_workers) as executor:
+        results = list(executor.map(lambda item: resolve_batch_item(item, journal), items))
+        for result in results:
+            if result["status"] == "RESOLVED":
+                check_batch_invoice(journal, result)
+        resolved = [result for result in results if result["status"] == "RESOLVED"]
+        chunks = [resolved[i:i + PROBE_CHUNK_SIZE] for i in range(0, len(resolved), PROBE_CHUNK_SIZE)]
+        list(executor.map(
+            lambda chunk: probe_batch_chunk(auth_token, wallet_id, chunk, max_fee, max_fee_percent),
+            chunks,
+        ))
+
+    ready = [result for result in results if result["status"] == "READY"]
+    print(f"{len(ready)} payments passed the fee check, paying with {workers} workers...")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda result: pay_batch_item(auth_token, wallet_id, result, journal), ready))
+
+    for result in results:
+        result["latency_ms"] = round((result["probe_ms"] or 0) + (result["pay_ms"] or 0), 1)
+    write_batch_results(output_path, results)
+
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    print("Batch finished:", ", ".join(f"{status}: {count}" for status, count in sorted(summary.items())))
+    print("Results written to", output_path)
+    return results
+
+def run_resume(auth_token):
+    journal = open_payment_journal(auth_token)
+    if journal is None:
+        print("The payment journal is disabled.")
+        return None
+    try:
+        results = journal.reconcile(auth_token)
+    finally:
+        journal.close()
+    if not results:
+        print("No payments are in flight.")
+    for entry in results:
+        line = f"{entry['payment_hash']}: {entry['status']}"
+        if entry["error"]:
+            line += f" ({entry['error']})"
+        print(line)
+    return results
+
+def main():
+    wallet_id = get_wallet_id(auth_token)
+    journal = open_payment_journal(auth_token)
+    try:
+        choose_and_pay(wallet_id, journal)
+    finally:
+        if journal is not None:
+            journal.close()
+
+def choose_and_pay(wallet_id, journal):
     if wallet_id:
         print("Choose payment method:")
         print("1. Lightning Invoice Payment")
         print("2. LNURL Payment")
         choice = input("Enter your choice (1 or 2): ")
         if choice == "1":
-            payment_request = input("Enter the Lightning Invoice: ")
+            payment_request = input("Enter the Lightning Invoice: ").strip()
+            try:
+                invoice = check_invoice(payment_request)
+            except ValueError as e:
+                print("Invalid invoice:", str(e))
+                return
+            print(f"Invoice amount: {invoice['amount']} satoshi")
+            if invoice["description"]:
+                print("Description:", invoice["description"])
             fee = probe_invoice_fee(auth_token, wallet_id, payment_request)
             if fee is not None:
                 print(f"Invoice fee: {fee} satoshi")
                 confirm = input("Do you want to proceed with the payment? (y/n): ")
                 if confirm.lower() == "y":
-                    pay_invoice(auth_token, wallet_id, payment_request)
+                    pay_and_report(journal, auth_token, wallet_id, payment_request)
                 else:
                     print("Payment canceled.")
             else:
@@ -193,7 +448,7 @@ if __name__ == "__main__":
                         print(f"Invoice fee: {fee} satoshi")
                         confirm = input("Do you want to proceed with the payment? (y/n): ")
                         if confirm.lower() == "y":
-                            pay_invoice(auth_token, wallet_id, ln_invoice)
+                            pay_and_report(journal, auth_token, wallet_id, ln_invoice)
                         else:
                             print("Payment canceled.")
                     else:
@@ -202,3 +457,28 @@ if __name__ == "__main__":
                     print("Error creating LN invoice:", str(e))
         else:
             print("Invalid choice. Please enter 1 or 2.")
+
+def add_arguments(parser):
+    parser.add_argument("--batch", help="CSV or JSONL file with destination, amount and memo columns")
+    parser.add_argument("--output", default="payout_results.jsonl", help="Results file (.csv or .jsonl)")
+    parser.add_argument("--max-fee", type=int, default=None, help="Maximum fee per payment in satoshis")
+    parser.add_argument("--max-fee-percent", type=float, default=None, help="Maximum fee as a percentage of the amount")
+    parser.add_argument("--workers", type=int, default=DEFAULT_PAY_WORKERS, help="Number of concurrent payments")
+    parser.add_argument("--probe-workers", type=int, default=DEFAULT_PROBE_WORKERS, help="Number of concurrent fee probes")
+    parser.add_argument("--resume", action="store_true", help="Reconcile payments left in flight by an interrupted run")
+
+def run(args):
+    if args.resume:
+        run_resume(auth_token)
+    elif args.batch:
+        run_batch(auth_token, args.batch, args.output, args.max_fee, args.max_fee_percent, args.workers, args.probe_workers)
+    else:
+        with RoundTripCounter() as round_trips:
+            main()
+        print("Round trips:", round_trips.count)
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send Lightning payments from your Blink wallet.")
+    add_arguments(parser)
+    run(parser.parse_args())
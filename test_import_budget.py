@@ -0,0 +1,43 @@
+import os
+import sys
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+HELP_BUDGET_MS = 50
+BALANCE_BUDGET_MS = 500
+HEAVY_MODULES = ("qrcode", "numpy", "sqlite3", "httpx")
+
+def import_times(*args):
+    """Runs python -X importtime and returns {module: cumulative_us} for the
+    top-level imports, plus the set of every module that was imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=REPO_DIR, capture_output=True, text=True, env=dict(os.environ, BLINK_NO_DAEMON="1"),
+    )
+    top_level = {}
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        modules.add(name.strip())
+        if not name[1:].startswith(" "):
+            top_level[name.strip()] = int(cumulative)
+    return top_level, modules
+
+def test_help_imports_no_network_code():
+    top_level, modules = import_times("blink.py", "--help")
+    for module in HEAVY_MODULES + ("requests", "dotenv"):
+        assert module not in modules, f"blink --help imported {module}"
+    # site runs before the command and is outside its control.
+    total_ms = sum(us for name, us in top_level.items() if name != "site") / 1000
+    assert total_ms < HELP_BUDGET_MS, f"blink --help spent {total_ms:.1f} ms importing"
+
+def test_balance_import_budget():
+    top_level, modules = import_times("-c", "import balance")
+    for module in HEAVY_MODULES:
+        assert module not in modules, f"importing balance loaded {module}"
+    total_ms = top_level["balance"] / 1000
+    assert total_ms < BALANCE_BUDGET_MS, f"importing balance took {total_ms:.1f} ms"
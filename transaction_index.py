@@ -0,0 +1,130 @@
+import os
+import json
+import sqlite3
+from blink_client import get_cache_dir, api_key_fingerprint
+from transactions import iter_transaction_edges, DEFAULT_PAGE_SIZE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    cursor TEXT,
+    created_at INTEGER,
+    payment_hash TEXT,
+    payment_request TEXT,
+    preimage TEXT,
+    settlement_amount INTEGER,
+    status TEXT,
+    node TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_payment_hash ON transactions (payment_hash);
+CREATE INDEX IF NOT EXISTS transactions_payment_request ON transactions (payment_request);
+CREATE INDEX IF NOT EXISTS transactions_preimage ON transactions (preimage);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def default_index_path(auth_token):
+    return os.path.join(get_cache_dir(), f"transactions-{api_key_fingerprint(auth_token)}.db")
+
+class TransactionIndex:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def get_state(self, key):
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_state(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    def stored_status(self, transaction_id):
+        row = self.conn.execute("SELECT status FROM transactions WHERE id = ?", (transaction_id,)).fetchone()
+        return row["status"] if row else None
+
+    def store(self, edge):
+        node = edge["node"]
+        initiation = node.get("initiationVia") or {}
+        settlement = node.get("settlementVia") or {}
+        self.conn.execute(
+            "INSERT OR REPLACE INTO transactions "
+            "(id, cursor, created_at, payment_hash, payment_request, preimage, settlement_amount, status, node) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                node["id"],
+                edge["cursor"],
+                node.get("createdAt"),
+                initiation.get("paymentHash"),
+                initiation.get("paymentRequest"),
+                settlement.get("preImage"),
+                node.get("settlementAmount"),
+                node.get("status"),
+                json.dumps(node),
+            ),
+        )
+
+    def pending_transactions(self):
+        rows = self.conn.execute("SELECT id, created_at FROM transactions WHERE status = 'PENDING'").fetchall()
+        return {row["id"]: row["created_at"] or 0 for row in rows}
+
+    def sync(self, auth_token, page_size=DEFAULT_PAGE_SIZE):
+        added = 0
+        initial_download = self.get_state("complete") != "1" and self.get_state("oldest_cursor") is None
+        # New transactions are prepended, so walk from the head until we reach a
+        # transaction we already hold in a final state, then keep going only as
+        # far as the oldest one still stored as PENDING.
+        pending = self.pending_transactions()
+        oldest_pending = min(pending.values(), default=0)
+        for edge in iter_transaction_edges(auth_token, page_size):
+            node = edge["node"]
+            known_status = self.stored_status(node["id"])
+            if known_status is not None and known_status != "PENDING":
+                if not pending or (node.get("createdAt") or 0) < oldest_pending:
+                    break
+                continue
+            pending.pop(node["id"], None)
+            self.store(edge)
+            added += 1
+            if initial_download:
+                self.set_state("oldest_cursor", edge["cursor"])
+            if added % page_size == 0:
+                self.conn.commit()
+        self.conn.commit()
+
+        # Resume an interrupted initial download from the oldest cursor we reached.
+        if self.get_state("complete") != "1":
+            oldest_cursor = self.get_state("oldest_cursor")
+            if oldest_cursor is not None:
+                for edge in iter_transaction_edges(auth_token, page_size, after=oldest_cursor):
+                    self.store(edge)
+                    added += 1
+                    self.set_state("oldest_cursor", edge["cursor"])
+                    if added % page_size == 0:
+                        self.conn.commit()
+            self.set_state("complete", "1")
+            self.conn.commit()
+        return added
+
+    def _lookup(self, column, value):
+        row = self.conn.execute(f"SELECT node FROM transactions WHERE {column} = ? ORDER BY created_at DESC LIMIT 1", (value,)).fetchone()
+        return json.loads(row["node"]) if row else None
+
+    def by_payment_hash(self, payment_hash):
+        return self._lookup("payment_hash", payment_hash)
+
+    def by_payment_request(self, payment_request):
+        return self._lookup("payment_request", payment_request)
+
+    def by_preimage(self, preimage):
+        return self._lookup("preimage", preimage)
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
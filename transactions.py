@@ -0,0 +1,59 @@
+from blink_client import graphql_request
+
+DEFAULT_PAGE_SIZE = 50
+
+TRANSACTIONS_QUERY = """
+query PaymentsWithProof($first: Int, $after: String) {
+  me {
+    defaultAccount {
+      transactions(first: $first, after: $after) {
+        pageInfo {
+          hasNextPage
+          endCursor
+        }
+        edges {
+          cursor
+          node {
+            id
+            createdAt
+            initiationVia {
+              ... on InitiationViaLn {
+                paymentRequest
+                paymentHash
+              }
+            }
+            settlementVia {
+              ... on SettlementViaIntraLedger {
+                preImage
+              }
+              ... on SettlementViaLn {
+                preImage
+              }
+            }
+            settlementAmount
+            status
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+def iter_transaction_pages(auth_token, page_size=DEFAULT_PAGE_SIZE, after=None, query=TRANSACTIONS_QUERY):
+    while True:
+        variables = {"first": page_size, "after": after}
+        response = graphql_request(auth_token, query, variables)
+        if response.status_code != 200:
+            raise Exception(f"Failed to fetch transactions. Status code: {response.status_code} Response: {response.text}")
+        data = response.json()
+        transactions = data["data"]["me"]["defaultAccount"]["transactions"]
+        page_info = transactions["pageInfo"]
+        yield transactions["edges"], page_info
+        if not page_info["hasNextPage"] or not page_info["endCursor"]:
+            return
+        after = page_info["endCursor"]
+
+def iter_transaction_edges(auth_token, page_size=DEFAULT_PAGE_SIZE, after=None, query=TRANSACTIONS_QUERY):
+    for edges, _ in iter_transaction_pages(auth_token, page_size, after, query):
+        yield from edges
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import threading
+from blink_client import graphql_request, get_cache_dir, api_key_fingerprint
+
+DEFAULT_TTL = 24 * 60 * 60
+
+WALLETS_QUERY = """
+query Wallets {
+  me {
+    defaultAccount {
+      wallets {
+        id
+        walletCurrency
+      }
+    }
+  }
+}
+"""
+
+_memory_cache = {}
+_lock = threading.Lock()
+
+def get_ttl():
+    return float(os.getenv("BLINK_WALLET_CACHE_TTL", DEFAULT_TTL))
+
+def disk_cache_enabled():
+    return os.getenv("BLINK_WALLET_CACHE_DISK", "1") != "0"
+
+def wallet_cache_path(auth_token):
+    return os.path.join(get_cache_dir(), f"wallets-{api_key_fingerprint(auth_token)}.json")
+
+def cached_wallets(auth_token):
+    key = api_key_fingerprint(auth_token)
+    now = time.time()
+    with _lock:
+        entry = _memory_cache.get(key)
+        if entry and entry["expires_at"] > now:
+            return entry["wallets"]
+    if not disk_cache_enabled():
+        return None
+    try:
+        with open(wallet_cache_path(auth_token)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry.get("expires_at", 0) <= now:
+        return None
+    with _lock:
+        _memory_cache[key] = entry
+    return entry["wallets"]
+
+def store_wallets(auth_token, wallets):
+    wallets = [{"id": wallet["id"], "walletCurrency": wallet["walletCurrency"]} for wallet in wallets]
+    entry = {"expires_at": time.time() + get_ttl(), "wallets": wallets}
+    with _lock:
+        _memory_cache[api_key_fingerprint(auth_token)] = entry
+    if disk_cache_enabled():
+        path = wallet_cache_path(auth_token)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print("Could not write wallet cache:", e)
+    return wallets
+
+def invalidate_wallets(auth_token=None):
+    with _lock:
+        if auth_token is None:
+            _memory_cache.clear()
+        else:
+            _memory_cache.pop(api_key_fingerprint(auth_token), None)
+    if disk_cache_enabled() and auth_token is not None:
+        try:
+            os.remove(wallet_cache_path(auth_token))
+        except OSError:
+            pass
+
+def parse_wallets_response(response):
+    if response.status_code == 200:
+        data = response.json()
+        return data["data"]["me"]["defaultAccount"]["wallets"]
+    else:
+        print("Failed to fetch wallet ID. Status code:", response.status_code)
+        print("Response:", response.text)
+        return None
+
+def find_wallet_id(wallets, currency="BTC"):
+    for wallet in wallets:
+        if wallet["walletCurrency"] == currency:
+            return wallet["id"]
+    print(f"{currency} wallet not found.")
+    return None
+
+def get_wallets(auth_token):
+    wallets = cached_wallets(auth_token)
+    if wallets is None:
+        wallets = parse_wallets_response(graphql_request(auth_token, WALLETS_QUERY))
+        if wallets is not None:
+            wallets = store_wallets(auth_token, wallets)
+    return wallets
+
+def get_wallet_id(auth_token, currency="BTC"):
+    wallets = get_wallets(auth_token)
+    if wallets is None:
+        return None
+    return find_wallet_id(wallets, currency)